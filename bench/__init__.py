@@ -0,0 +1,9 @@
+"""Benchmarks for pyrepl.
+
+These are not tests: run them directly, e.g.
+
+    python -m bench.disp_str
+    python -m bench.pipeline
+    python -m bench.render
+    python -m bench.startup
+"""
@@ -0,0 +1,66 @@
+"""Measure the throughput of reader.disp_str, in characters per second,
+on plain ASCII and on text full of control characters.
+
+'reference' is the straightforward per-character implementation that
+disp_str used to be, 'uncached' is disp_str with its memoization
+defeated and 'cached' is disp_str redisplaying lines it has seen."""
+
+from __future__ import print_function
+
+import time
+
+from pyrepl import reader
+
+
+def reference_disp_str(buffer, uc=reader._my_unctrl):
+    s = [uc(x) for x in buffer]
+    b = []
+    for x in s:
+        b.append(1)
+        b.extend([0] * (len(x) - 1))
+    return ''.join(s), b
+
+
+def make_lines(kind, count=500, width=70):
+    if kind == 'ascii':
+        pattern = 'for i in range(10): print(i, "hello world")  # '
+    else:
+        pattern = 'a\x01b\tc\x1b[1md\x7fe\x00'
+    lines = []
+    for i in range(count):
+        line = (pattern * (width // len(pattern) + 1))[:width - 6]
+        lines.append('%s%06d' % (line, i))
+    return lines
+
+
+def run(lines, mode, repeat=5):
+    func = reader.disp_str
+    if mode == 'reference':
+        func = reference_disp_str
+    best = None
+    for _ in range(repeat):
+        reader._disp_cache.clear()
+        if mode == 'cached':
+            for line in lines:
+                func(line)
+        t0 = time.time()
+        for line in lines:
+            if mode == 'uncached':
+                reader._disp_cache.clear()
+            func(line)
+        t = time.time() - t0
+        if best is None or t < best:
+            best = t
+    return sum(map(len, lines)) / best
+
+
+def main():
+    for kind in 'ascii', 'control':
+        lines = make_lines(kind)
+        for mode in 'reference', 'uncached', 'cached':
+            print('%-8s %-10s %12.0f chars/s' % (
+                kind, mode, run(lines, mode)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Replay scripted keystrokes through the readers and report how long
+each command took to process and display, end to end.
+
+The console is headless: like UnixConsole it shows a window of the
+screen that follows the cursor, and it counts the bytes a terminal
+that redraws only changed lines of that window would be sent, so
+nothing here needs a tty and everything runs offline.  Run with
+
+    python -m bench.pipeline [scenario ...]
+
+For each scenario this prints the median and 99th percentile latency
+per command, the peak memory allocated while replaying it (where
+tracemalloc is available) and the bytes rendered per frame."""
+
+from __future__ import print_function
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from pyrepl.console import Console, Event
+from pyrepl.reader import Reader
+from pyrepl.historical_reader import HistoricalReader
+from pyrepl.completing_reader import CompletingReader
+
+
+class HeadlessConsole(Console):
+    height = 50
+    width = 100
+    encoding = 'utf-8'
+
+    def __init__(self):
+        self.events = deque()
+        self.screen = []
+        self.offset = 0
+        self.frames = 0
+        self.bytes = 0
+
+    def refresh(self, screen, xy, top=0, total=None):
+        cy = xy[1]
+        offset = self.offset
+        if cy < offset:
+            offset = cy
+        elif cy >= offset + self.height:
+            offset = cy - self.height + 1
+        screen = screen[offset - top:offset - top + self.height]
+        old = self.screen
+        if offset != self.offset:
+            old = []
+        for y, line in enumerate(screen):
+            if y >= len(old) or old[y] != line:
+                self.bytes += len(line.encode(self.encoding, 'replace')) + 1
+        self.bytes += max(len(old) - len(screen), 0)
+        self.screen = screen
+        self.offset = offset
+        self.frames += 1
+
+    def get_event(self, block=1):
+        if not self.events:
+            raise RuntimeError("script ran out of events")
+        return self.events.popleft()
+
+    def get_window_height(self):
+        return self.height
+
+    def getheightwidth(self):
+        return self.height, self.width
+
+
+def keys(text):
+    return [Event('key', c, c.encode('utf-8')) for c in text]
+
+
+class WordCompletingReader(CompletingReader):
+    words = ['%s_%d' % (w, i) for w in ('alpha', 'beta', 'gamma')
+             for i in range(3000)]
+
+    def get_completions(self, stem):
+        return [w for w in self.words if w.startswith(stem)]
+
+
+class SuggestingReader(HistoricalReader):
+    autosuggest = True
+
+
+def sample_code(lines):
+    body = ['def f%d(x):' % i if i % 5 == 0 else
+            '    return x * %d + len("some text %d")' % (i, i)
+            for i in range(lines)]
+    return '\n'.join(body)
+
+
+def sample_history(count):
+    history = ['print(%d * %d)' % (i, i % 97) for i in range(count)]
+    history[10] = 'import numpy as np'
+    return history
+
+
+def typing_setup(lines):
+    def setup(reader):
+        reader.buffer = sample_code(lines)
+        reader.pos = len(reader.buffer)
+    return setup
+
+
+def history_setup(count):
+    def setup(reader):
+        reader.history = sample_history(count)
+        reader.historyi = len(reader.history)
+    return setup
+
+
+def namespace_setup(count):
+    def setup(reader):
+        reader.locals.update(('name_%d' % i, i) for i in range(count))
+    return setup
+
+
+def pythonic_reader(console):
+    # PythonicReader loads and, at exit, saves ~/.pythoni.hist; keep it
+    # away from the real one.  The directory is removed after all the
+    # readers have saved their history (atexit runs functions last in,
+    # first out).
+    if not os.environ.get('PYREPL_BENCH_HOME'):
+        home = tempfile.mkdtemp()
+        atexit.register(shutil.rmtree, home, True)
+        os.environ['HOME'] = os.environ['PYREPL_BENCH_HOME'] = home
+    from pyrepl.python_reader import PythonicReader
+    return PythonicReader(console, {})
+
+
+# name: (reader factory, setup, events)
+SCENARIOS = [
+    ('type-10-lines', Reader, typing_setup(10),
+     keys('x = foo(1, 2) + bar[3]  # typing ' * 6)),
+    ('type-2000-lines', Reader, typing_setup(2000),
+     keys('x = foo(1, 2) + bar[3]  # typing ' * 2)),
+    ('paste-100kb', pythonic_reader, typing_setup(0),
+     [Event('paste', sample_code(2100)[:100000])]),
+    ('isearch-100k', HistoricalReader, history_setup(100000),
+     keys('\x12import nu\x12\x12')),
+    ('autosuggest-100k', SuggestingReader, history_setup(100000),
+     keys('print(1234 * 5') + [Event('key', 'backspace', b'\x7f')] * 3 +
+     keys('2)')),
+    ('fuzzy-100k', HistoricalReader, history_setup(100000),
+     keys('\x18\x12print(99') + [Event('key', 'backspace', b'\x7f')] * 8 +
+     keys('nmp')),
+    ('complete-50k-names', pythonic_reader, namespace_setup(50000),
+     keys('name_123\t\t4\t')),
+    ('complete-9000', WordCompletingReader, typing_setup(0),
+     keys('gamma_1\t\t')),
+]
+
+
+def replay(factory, setup, events, trace_memory=False):
+    """Return the time taken by each command, the bytes rendered, the
+    number of frames and, if trace_memory is true, the peak memory
+    allocated while replaying the events."""
+    console = HeadlessConsole()
+    reader = factory(console)
+    reader.prepare()
+    peak = None
+    try:
+        setup(reader)
+        reader.refresh()
+        console.bytes = console.frames = 0
+        console.events.extend(events)
+        times = []
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            while console.events:
+                t0 = time.time()
+                reader.handle1()
+                times.append(time.time() - t0)
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+    finally:
+        reader.restore()
+    return times, console.bytes, console.frames, peak
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def main(names):
+    print('%-16s %6s %10s %10s %10s %12s' % (
+        'scenario', 'cmds', 'p50 ms', 'p99 ms', 'peak KB', 'bytes/frame'))
+    for name, factory, setup, events in SCENARIOS:
+        if names and name not in names:
+            continue
+        times, nbytes, frames, _ = replay(factory, setup, events)
+        if tracemalloc is None:
+            peak = None
+        else:
+            peak = replay(factory, setup, events, trace_memory=True)[3]
+        print('%-16s %6d %10.3f %10.3f %10s %12.0f' % (
+            name, len(times),
+            percentile(times, 50) * 1000, percentile(times, 99) * 1000,
+            '-' if peak is None else '%.0f' % (peak / 1024.0),
+            nbytes / float(max(frames, 1))))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
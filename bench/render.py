@@ -0,0 +1,114 @@
+"""Measure what UnixConsole sends to the terminal to draw typical
+sequences of frames, using the emulator in testing/vterm.py on a
+pseudo-terminal, and check that the result is what was asked for.
+
+    python -m bench.render [scenario ...]
+
+For each scenario this prints the frames drawn and, per frame, the
+average number of bytes written, cursor movements and lines printed
+over in full, and the time UnixConsole.refresh took."""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import time
+
+from pyrepl.unicode_width import WIDE_PAD
+from testing.vterm import PtyTerminal
+
+HEIGHT = 24
+WIDTH = 80
+
+
+def typing_at_end():
+    line = 'for i in range(10): print(i, "hello world")'
+    for i in range(len(line) + 1):
+        yield ['>>> ' + line[:i]], (4 + i, 0)
+
+
+def typing_in_middle():
+    line = 'print(x)'
+    inserted = 'some_function(1, 2, 3) + '
+    for i in range(len(inserted) + 1):
+        text = line[:6] + inserted[:i] + line[6:]
+        yield ['>>> ' + text], (10 + i, 0)
+
+
+def deleting_in_middle():
+    for screen, (x, y) in reversed(list(typing_in_middle())):
+        yield screen, (x, y)
+
+
+def inserting_lines_at_top():
+    lines = ['    value_%d = compute(%d)' % (i, i) for i in range(15)]
+    for i in range(6):
+        screen = ['... new_%d = %d' % (j, j) for j in range(i)] + lines
+        yield screen, (4, max(i - 1, 0))
+
+
+def moving_through_tall_buffer():
+    lines = ['line %d of a long buffer' % i for i in range(100)]
+    for y in list(range(99, -1, -1)) + list(range(0, 100, 7)):
+        yield lines, (0, y)
+
+
+def editing_wide_text():
+    text = 'x = "\u4e2d\u6587\u5b57\u7b26"  # \u65e5\u672c\u8a9e'
+    padded = ''.join(c + WIDE_PAD if c > '\u2e80' else c for c in text)
+    for i in range(len(padded) + 1):
+        if padded[i:i + 1] != WIDE_PAD:
+            yield ['>>> ' + padded[:i]], (4 + i, 0)
+
+
+SCENARIOS = [
+    ('type-at-end', typing_at_end),
+    ('type-in-middle', typing_in_middle),
+    ('delete-in-middle', deleting_in_middle),
+    ('insert-lines-at-top', inserting_lines_at_top),
+    ('move-through-tall', moving_through_tall_buffer),
+    ('edit-wide-text', editing_wide_text),
+]
+
+
+def run(frames):
+    """Return the number of frames, totals of bytes, moves, rewrites
+    and seconds, and the number of frames drawn wrongly."""
+    term = PtyTerminal(HEIGHT, WIDTH)
+    term.prepare()
+    n = nbytes = moves = rewrites = wrong = 0
+    elapsed = 0.0
+    try:
+        for screen, cxy in frames:
+            t0 = time.time()
+            vt = term.refresh(list(screen), cxy)
+            elapsed += time.time() - t0
+            n += 1
+            nbytes += vt.bytes
+            moves += vt.moves
+            rewrites += vt.line_rewrites
+            expected = screen[cxy[1]].replace(WIDE_PAD, '')
+            if vt.line(vt.y) != expected.rstrip(' '):
+                wrong += 1
+    finally:
+        term.restore()
+        term.close()
+    return n, nbytes, moves, rewrites, elapsed, wrong
+
+
+def main(names):
+    os.environ.pop('LINES', None)
+    os.environ.pop('COLUMNS', None)
+    print('%-20s %6s %8s %8s %9s %9s %6s' % (
+        'scenario', 'frames', 'bytes', 'moves', 'rewrites', 'us', 'wrong'))
+    for name, frames in SCENARIOS:
+        if names and name not in names:
+            continue
+        n, nbytes, moves, rewrites, elapsed, wrong = run(frames())
+        print('%-20s %6d %8.1f %8.1f %9.2f %9.1f %6d' % (
+            name, n, nbytes / float(n), moves / float(n),
+            rewrites / float(n), elapsed / n * 1e6, wrong))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,123 @@
+"""Measure how long the readers take to load a long history file and
+show their first prompt, and what the history entries not loaded up
+front cost later.
+
+    python -m bench.startup [scenario ...]
+
+Each scenario writes a history file of the given number of entries to
+a temporary HOME.  For each this prints the best of a few runs of:
+loading the file and drawing the first prompt ('startup'), going back
+one entry and then 4999 more, and the first incremental search for
+something not in the history, which needs all the entries."""
+
+from __future__ import print_function
+
+import os
+import pty
+import shutil
+import sys
+import tempfile
+import time
+
+from pyrepl.console import Event
+from bench.pipeline import HeadlessConsole, sample_history
+
+REPEAT = 5
+
+
+def write_pythoni_hist(home, count):
+    with open(os.path.join(home, '.pythoni.hist'), 'wb') as f:
+        f.write(b'\n'.join(item.encode('unicode_escape')
+                           for item in sample_history(count)))
+
+
+def write_readline_history(home, count):
+    with open(os.path.join(home, '.history'), 'wb') as f:
+        for item in sample_history(count):
+            f.write(item.replace('\n', '\r\n').encode('utf-8') + b'\n')
+
+
+def pythonic_reader():
+    from pyrepl.python_reader import PythonicReader
+    console = HeadlessConsole()
+    t0 = time.time()
+    reader = PythonicReader(console, {})
+    reader.prepare()
+    reader.refresh()
+    return reader, time.time() - t0
+
+
+def readline_reader():
+    from pyrepl.readline import _ReadlineWrapper
+    master, slave = pty.openpty()
+    try:
+        wrapper = _ReadlineWrapper(slave, slave)
+        reader = wrapper.get_reader()
+        # the console is not what is measured
+        reader.console = HeadlessConsole()
+        t0 = time.time()
+        wrapper.read_history_file('~/.history')
+        reader.prepare()
+        reader.refresh()
+        return reader, time.time() - t0
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def timed(reader, *events):
+    reader.console.events.extend(events)
+    t0 = time.time()
+    while reader.console.events:
+        reader.handle1()
+    return time.time() - t0
+
+
+SCENARIOS = [
+    ('pythoni-hist-10k', write_pythoni_hist, 10000, pythonic_reader),
+    ('pythoni-hist-200k', write_pythoni_hist, 200000, pythonic_reader),
+    ('readline-200k', write_readline_history, 200000, readline_reader),
+]
+
+
+def run(write, count, make_reader):
+    home = tempfile.mkdtemp()
+    old_home = os.environ.get('HOME')
+    os.environ['HOME'] = home
+    try:
+        write(home, count)
+        results = []
+        for _ in range(REPEAT):
+            reader, startup = make_reader()
+            back = timed(reader, Event('previous-history', None))
+            far = timed(reader, *[Event('previous-history', None)] * 4999)
+            reader.restore()
+            # a search for something not there looks at every entry
+            reader = make_reader()[0]
+            search = timed(reader, Event('reverse-history-isearch', None),
+                           Event('isearch-add-character', 'z'))
+            reader.restore()
+            results.append((startup, back, far, search))
+        return [min(column) for column in zip(*results)]
+    finally:
+        if old_home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = old_home
+        shutil.rmtree(home, True)
+
+
+def main(names):
+    print('%-18s %8s %12s %10s %10s %10s' % (
+        'scenario', 'entries', 'startup ms', 'back ms', '4999 ms',
+        'search ms'))
+    for name, write, count, make_reader in SCENARIOS:
+        if names and name not in names:
+            continue
+        times = run(write, count, make_reader)
+        print('%-18s %8d %12.2f %10.3f %10.2f %10.2f' % (
+            (name, count) + tuple(t * 1000 for t in times)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
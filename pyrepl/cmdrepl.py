@@ -37,6 +37,7 @@ from __future__ import print_function
 
 from pyrepl import completer
 from pyrepl.completing_reader import CompletingReader as CR
+from pyrepl.history import History
 import cmd
 
 
@@ -78,7 +79,8 @@ def replize(klass, history_across_invocations=1):
 #        print "this may not work"
 
     class MultiHist(object):
-        __history = []
+        # shared by all the readers, so must not be converted
+        __history = History()
 
         def __init__(self, *args, **kw):
             super(MultiHist, self).__init__(*args, **kw)
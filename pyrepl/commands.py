@@ -297,6 +297,15 @@ class self_insert(EditCommand):
         r = self.reader
         r.insert(self.event * r.get_arg())
 
+class paste(EditCommand):
+    def text(self):
+        return self.event.replace('\r\n', '\n').replace('\r', '\n')
+
+    def do(self):
+        # the text of a bracketed paste arrives in one event and goes
+        # into the buffer in one go, newlines and all
+        self.reader.insert(self.text())
+
 class insert_nl(EditCommand):
     def do(self):
         r = self.reader
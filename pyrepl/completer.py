@@ -17,16 +17,74 @@
 # CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN
 # CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
+import keyword
+from bisect import bisect_left
+
 try:
     import __builtin__ as builtins
     builtins  # silence broken pyflakes
 except ImportError:
     import builtins
 
+from pyrepl.history import _MAX_CHAR
+
+
+class NameIndex(object):
+    """The names in a namespace, sorted, so that those starting with a
+    prefix are found by bisection, already sorted.
+
+    The names are sorted again when the namespace is a different
+    object, has a different number of names or a different last name
+    than last time, or when a match is no longer in the namespace.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.namespace = None
+        self.key = None
+
+    def matches(self, namespace, prefix):
+        key = len(namespace), _last_name(namespace)
+        if namespace is not self.namespace or key != self.key:
+            self.rebuild(namespace, key)
+        matches = self.lookup(prefix)
+        for name in matches:
+            if name not in namespace:
+                # replaced by a name added before the last one
+                self.rebuild(namespace, key)
+                return self.lookup(prefix)
+        return matches
+
+    def rebuild(self, namespace, key):
+        try:
+            self.names = sorted(namespace)
+        except TypeError:
+            # some keys aren't strings
+            self.names = sorted(name for name in namespace
+                                if hasattr(name, 'startswith'))
+        self.namespace = namespace
+        self.key = key
+
+    def lookup(self, prefix):
+        names = self.names
+        return names[bisect_left(names, prefix):
+                     bisect_left(names, prefix + _MAX_CHAR)]
+
+
+def _last_name(namespace):
+    """The most recently added name, where the namespace keeps them in
+    insertion order, else None."""
+    try:
+        return next(reversed(namespace), None)
+    except TypeError:
+        # a dict without reversed() (before Python 3.8)
+        return None
+
 
 class Completer(object):
     def __init__(self, ns):
         self.ns = ns
+        self.indexes = NameIndex(), NameIndex(), NameIndex()
 
     def complete(self, text):
         if "." in text:
@@ -37,18 +95,21 @@ class Completer(object):
     def global_matches(self, text):
         """Compute matches when text is a simple name.
 
-        Return a list of all keywords, built-in functions and names
-        currently defines in __main__ that match.
+        Return a sorted list, without duplicates, of all keywords,
+        built-in functions and names currently defined in __main__
+        that match.
 
         """
-        import keyword
-        matches = []
-        for list in [keyword.kwlist,
-                     builtins.__dict__.keys(),
-                     self.ns.keys()]:
-            for word in list:
-                if word.startswith(text) and word != "__builtins__":
-                    matches.append(word)
+        lists = [index.matches(names, text) for index, names in
+                 zip(self.indexes,
+                     [keyword.kwlist, builtins.__dict__, self.ns])]
+        lists = [l for l in lists if l]
+        if len(lists) == 1:
+            matches = lists[0]
+        else:
+            matches = sorted(set().union(*lists))
+        if "__builtins__" in matches:
+            matches = [word for word in matches if word != "__builtins__"]
         return matches
 
     def attr_matches(self, text):
@@ -58,7 +119,7 @@ class Completer(object):
         evaluatable in the globals of __main__, it will be evaluated
         and its attributes (as revealed by dir()) are used as possible
         completions.  (For class instances, class members are are also
-        considered.)
+        considered.)  The matches are sorted, without duplicates.
 
         WARNING: this can still invoke arbitrary C code, if an object
         with a __getattr__ hook is evaluated.
@@ -74,12 +135,11 @@ class Completer(object):
         if hasattr(object, '__class__'):
             words.append('__class__')
             words = words + get_class_members(object.__class__)
-        matches = []
-        n = len(attr)
-        for word in words:
-            if word[:n] == attr and word != "__builtins__":
-                matches.append("%s.%s" % (expr, word))
-        return matches
+        words = sorted(set(words))
+        words = words[bisect_left(words, attr):
+                      bisect_left(words, attr + _MAX_CHAR)]
+        return ["%s.%s" % (expr, word) for word in words
+                if word != "__builtins__"]
 
 
 def get_class_members(klass):
@@ -21,6 +21,7 @@
 import re
 from pyrepl import commands, reader
 from pyrepl.reader import Reader
+from pyrepl.unicode_width import WIDE_PAD, pad_wide, str_width
 
 
 def prefix(wordlist, j=0):
@@ -45,16 +46,19 @@ def stripcolor(s):
 
 
 def real_len(s):
-    return len(stripcolor(s))
+    return str_width(stripcolor(s))
 
 
 def left_align(s, maxlen):
-    stripped = stripcolor(s)
+    stripped = pad_wide(stripcolor(s))
     if len(stripped) > maxlen:
         # too bad, we remove the color
+        if stripped[maxlen] == WIDE_PAD:
+            # and half of a double-width character
+            return stripped[:maxlen - 1] + ' '
         return stripped[:maxlen]
     padding = maxlen - len(stripped)
-    return s + ' ' * padding
+    return pad_wide(s) + ' ' * padding
 
 
 def build_menu(cons, wordlist, start, use_brackets, sort_in_column):
@@ -235,10 +239,7 @@ class CompletingReader(Reader):
     def calc_screen(self):
         screen = super(CompletingReader, self).calc_screen()
         if self.cmpltn_menu_vis:
-            ly = self.lxy[1]
-            screen[ly:ly] = self.cmpltn_menu
-            self.screeninfo[ly:ly] = [(0, [])] * len(self.cmpltn_menu)
-            self.cxy = self.cxy[0], self.cxy[1] + len(self.cmpltn_menu)
+            self.insert_screen_rows(screen, self.lxy[1], self.cmpltn_menu)
         return screen
 
     def finish(self):
@@ -44,6 +44,11 @@ class Console(object):
     """
 
     def refresh(self, screen, xy):
+        """Display screen, a list of rows, with the cursor at xy.
+        Consoles that display a window of rows (see get_window_height)
+        are called as refresh(screen, xy, top, total) instead, where
+        screen holds rows top to top + len(screen) of total; the rows
+        they leave out are too far from the cursor to be displayed."""
         pass
 
     def prepare(self):
@@ -98,3 +103,15 @@ class Console(object):
     def wait(self):
         """Wait for an event."""
         pass
+
+    def get_window_height(self):
+        """Return the number of rows of the screen the console displays
+        at a time, always including the cursor's, or None if it
+        displays all of them.  The reader needs to lay out, and pass
+        to refresh, only the rows that can appear in such a window."""
+        return None
+
+    def input_pending(self):
+        """Return true if input is waiting to be processed, in which
+        case the screen is about to change again anyway."""
+        return False
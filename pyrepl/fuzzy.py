@@ -0,0 +1,192 @@
+"""Fuzzy search of a history, ranked by frequency and recency too.
+
+An entry matches a query when the characters of the query appear in
+it in order, not necessarily next to each other.  Of the entries that
+match, the best ones are those used often and recently, and matched
+closely: the characters left out between the first and the last one
+matched, and before the first, count against an entry.
+
+Entries are ranked first by their frecency, the log of how often they
+occur in the history plus how recently they last did, a doubling of
+the first being worth half_life entries of the second.  That order
+doesn't change as lines are added, so the entries are joined in it,
+with a separator between them, into one string that a regular
+expression scans at C speed for the entries that match.  Since how
+closely an entry matches only lowers its score, the scan stops as soon
+as no entry after the ones found so far can beat them.
+
+Every character added to the query makes a new stage.  It first
+checks, one by one, only the entries the stage before found; they are
+sorted by frecency, so the scan of the rest resumes where that one
+stopped, and none of the entries already scanned past has to be looked
+at again.  Removing a character goes back to the stage before, whose
+results are kept.
+"""
+
+import math
+import re
+from collections import Counter
+from heapq import heappush, heapreplace
+from itertools import repeat
+from operator import add, mul
+
+# separates the entries in the text scanned; never matched
+SEP = u'\x00'
+
+
+class _Stage(object):
+
+    def __init__(self, query, parent=None):
+        self.query = query
+        self.parent = parent
+        # the entries found to match, in frecency order: their ranks,
+        # where the match of the query in them ends, how many characters
+        # are left out in it and where it starts
+        self.ranks = []
+        self.ends = []
+        self.gaps = []
+        self.starts = []
+        self.top = None
+        if parent is None:
+            # everything is still to be scanned
+            self.pos = self.rank = self.inherited = 0
+            self.exhausted = False
+        else:
+            # the entries parent found are checked first, then the scan
+            # goes on from where parent's got to
+            self.pos, self.rank = parent.pos, parent.rank
+            self.inherited = len(parent.ranks)
+            self.exhausted = parent.exhausted
+        self.checked = 0
+        self.pattern = re.compile(u''.join(
+            re.escape(c) + u'[^%s%s]*' % (SEP, re.escape(d))
+            for c, d in zip(query, query[1:])) + re.escape(query[-1:]))
+
+
+class FuzzyFinder(object):
+    """Find the entries of a history matching a query, best first.
+
+    The history is read once, when the finder is made; add() and
+    back() add a character to the query and remove the last one."""
+
+    # how many entries more recently used make up for being used half
+    # as often
+    half_life = 200
+
+    def __init__(self, history):
+        items = list(history)
+        n = len(items)
+        scale = math.log(2) / self.half_life
+        last = dict(zip(items, range(n)))
+        if len(last) == n:
+            # each entry occurs once, so the most recent come first
+            self.entries = items[::-1]
+            self.keys = list(map(mul, range(n - 1, -1, -1), repeat(scale)))
+        else:
+            counts = Counter(items)
+            entries = list(last)
+            keys = list(map(add,
+                            map(math.log, map(counts.__getitem__, entries)),
+                            map(mul, map(last.__getitem__, entries),
+                                repeat(scale))))
+            order = sorted(range(len(entries)), key=keys.__getitem__,
+                           reverse=True)
+            self.entries = list(map(entries.__getitem__, order))
+            self.keys = list(map(keys.__getitem__, order))
+        self.texts = self.entries
+        text = SEP.join(self.texts)
+        if text.count(SEP) >= len(self.texts):
+            # some entries contain it
+            self.texts = [t.replace(SEP, u' ') for t in self.texts]
+            text = SEP.join(self.texts)
+        self.text = text
+        self.stages = [_Stage(u'')]
+
+    @property
+    def query(self):
+        return self.stages[-1].query
+
+    def add(self, c):
+        """Add the character c to the query."""
+        self.stages.append(_Stage(self.query + c, self.stages[-1]))
+
+    def back(self):
+        """Remove the last character of the query, if any."""
+        if len(self.stages) > 1:
+            self.stages.pop()
+
+    def penalty(self, gaps, start):
+        """How much a match leaving out gaps characters, and starting
+        at start, lowers the score of an entry."""
+        return math.log(1 + (gaps + start / 4.0) / 4.0)
+
+    def _next(self, stage):
+        """Find the next entry matching the query of stage; return
+        false if there are no more."""
+        if stage.exhausted and stage.checked >= stage.inherited:
+            return False
+        parent = stage.parent
+        c = stage.query[-1]
+        texts = self.texts
+        while stage.checked < stage.inherited:
+            i = stage.checked
+            stage.checked += 1
+            rank = parent.ranks[i]
+            end = parent.ends[i]
+            p = texts[rank].find(c, end)
+            if p != -1:
+                self._found(stage, rank, p + 1, parent.gaps[i] + p - end,
+                            parent.starts[i])
+                return True
+        if stage.exhausted:
+            return False
+        text = self.text
+        m = stage.pattern.search(text, stage.pos)
+        if m is None:
+            stage.exhausted = True
+            return False
+        first, last = m.span()
+        stage.rank += text.count(SEP, stage.pos, first)
+        record = text.rfind(SEP, 0, first) + 1
+        self._found(stage, stage.rank, last - record,
+                    last - first - len(stage.query), first - record)
+        stage.pos = text.find(SEP, last) + 1
+        stage.rank += 1
+        if not stage.pos:
+            stage.exhausted = True
+        return True
+
+    def _found(self, stage, rank, end, gaps, start):
+        stage.ranks.append(rank)
+        stage.ends.append(end)
+        stage.gaps.append(gaps)
+        stage.starts.append(start)
+
+    def best(self, n):
+        """Return the indices in self.entries of the n best entries for
+        the query, best first."""
+        stage = self.stages[-1]
+        if stage.top is not None and len(stage.top) >= n:
+            return stage.top[:n]
+        if not stage.query:
+            stage.top = list(range(min(n, len(self.entries))))
+            return stage.top
+        keys = self.keys
+        heap = []
+        i = 0
+        while 1:
+            if i == len(stage.ranks) and not self._next(stage):
+                break
+            rank = stage.ranks[i]
+            score = keys[rank] - self.penalty(stage.gaps[i], stage.starts[i])
+            i += 1
+            if len(heap) < n:
+                heappush(heap, (score, -rank))
+            elif score > heap[0][0]:
+                heapreplace(heap, (score, -rank))
+            # the entries still to come score no more than keys[rank]
+            if len(heap) == n and keys[rank] <= heap[0][0]:
+                break
+        heap.sort(reverse=True)
+        stage.top = [-rank for score, rank in heap]
+        return stage.top
@@ -0,0 +1,308 @@
+"""A gap buffer for the characters of a Reader.
+
+Editing happens almost exclusively around the insertion point, so the
+characters are kept in two lists: the ones before the gap, in order,
+and the ones after the gap, in reverse order.  Inserting or deleting
+at the gap is then an append or a pop, and moving the gap costs time
+proportional to the distance moved.
+
+The offsets of the newlines are kept the same way: those before the
+gap as positions from the start of the buffer, those after it as
+indices into the reversed list.  Neither changes when text is inserted
+or deleted at the gap, so the index is maintained incrementally and
+finding the start or end of a line is a bisection.
+
+Each modification also notes which lines it replaced, so that whoever
+displays the buffer can ask with changed_lines() which lines it has to
+look at again.
+
+GapBuffer supports the subset of the list interface that commands
+have historically used on ``reader.buffer`` (indexing, slicing, slice
+assignment, ``del``, ``insert``, ``count``, ``index``, ``in``...);
+slices are returned as plain lists.
+"""
+
+from bisect import bisect_left, bisect_right
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+
+def _newlines(chars, offset):
+    """Return the positions of the newlines in chars, counting from
+    offset."""
+    try:
+        text = unicode('').join(chars)
+    except TypeError:
+        text = None
+    if text is None or len(text) != len(chars):
+        return [offset + i for i, c in enumerate(chars) if c == '\n']
+    result = []
+    i = text.find('\n')
+    while i != -1:
+        result.append(offset + i)
+        i = text.find('\n', i + 1)
+    return result
+
+
+class GapBuffer(object):
+
+    def __init__(self, chars=()):
+        self._front = list(chars)   # characters before the gap
+        self._back = []             # characters after the gap, reversed
+        self._nl_front = _newlines(self._front, 0)
+        self._nl_back = []          # indices into _back, ascending
+        self._text = None
+        # (i, j, k): lines i to j of the buffer as it was at the last
+        # call to changed_lines() are now lines i to k; or None
+        self._changed = None
+
+    def __len__(self):
+        return len(self._front) + len(self._back)
+
+    def __iter__(self):
+        for c in self._front:
+            yield c
+        for c in reversed(self._back):
+            yield c
+
+    def __contains__(self, c):
+        if c == '\n':
+            return bool(self._nl_front or self._nl_back)
+        return c in self._front or c in self._back
+
+    def __eq__(self, other):
+        if isinstance(other, (GapBuffer, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'GapBuffer(%r)' % (list(self),)
+
+    def _index(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("GapBuffer index out of range")
+        return i
+
+    def _range(self, s):
+        start, stop, step = s.indices(len(self))
+        if step != 1:
+            raise ValueError("GapBuffer does not support extended slices")
+        return start, max(start, stop)
+
+    def move_gap(self, p):
+        """Move the gap to position p."""
+        front, back = self._front, self._back
+        nl_front, nl_back = self._nl_front, self._nl_back
+        k = len(front)
+        lb = len(back)
+        if p < k:
+            i = bisect_left(nl_front, p)
+            if i < len(nl_front):
+                nl_back.extend([lb + k - 1 - q
+                                for q in reversed(nl_front[i:])])
+                del nl_front[i:]
+            back.extend(reversed(front[p:]))
+            del front[p:]
+        elif p > k:
+            n = p - k
+            i = bisect_left(nl_back, lb - n)
+            if i < len(nl_back):
+                nl_front.extend([k + lb - 1 - j
+                                 for j in reversed(nl_back[i:])])
+                del nl_back[i:]
+            front.extend(reversed(back[-n:]))
+            del back[-n:]
+
+    def __getitem__(self, i):
+        front, back = self._front, self._back
+        if isinstance(i, slice):
+            start, stop = self._range(i)
+            k = len(front)
+            n = len(self)
+            if stop <= k:
+                return front[start:stop]
+            elif start >= k:
+                return back[n - stop:n - start][::-1]
+            else:
+                return front[start:] + back[n - stop:][::-1]
+        i = self._index(i)
+        k = len(front)
+        if i < k:
+            return front[i]
+        return back[len(self) - 1 - i]
+
+    def __setitem__(self, i, value):
+        self._text = None
+        nl_front = self._nl_front
+        if isinstance(i, slice):
+            start, stop = self._range(i)
+            self.move_gap(stop)
+            line = bisect_left(nl_front, start)
+            removed = len(nl_front) - line
+            del nl_front[line:]
+            if not isinstance(value, (list, unicode, str)):
+                value = list(value)
+            self._front[start:] = value
+            nl_front.extend(_newlines(value, start))
+            self._note_change(line, removed, len(nl_front) - line)
+        else:
+            i = self._index(i)
+            self.move_gap(i + 1)
+            line = bisect_left(nl_front, i)
+            removed = added = 0
+            if self._front[i] == '\n':
+                nl_front.pop()
+                removed = 1
+            self._front[i] = value
+            if value == '\n':
+                nl_front.append(i)
+                added = 1
+            self._note_change(line, removed, added)
+
+    def __delitem__(self, i):
+        self._text = None
+        nl_front = self._nl_front
+        if isinstance(i, slice):
+            start, stop = self._range(i)
+            self.move_gap(stop)
+            line = bisect_left(nl_front, start)
+            removed = len(nl_front) - line
+            del nl_front[line:]
+            del self._front[start:]
+        else:
+            i = self._index(i)
+            self.move_gap(i + 1)
+            line = bisect_left(nl_front, i)
+            removed = 0
+            if self._front.pop() == '\n':
+                nl_front.pop()
+                removed = 1
+        self._note_change(line, removed, 0)
+
+    def _note_change(self, line, removed, added):
+        """Note that the lines line to line + removed have been
+        replaced by the lines line to line + added."""
+        old_end = line + removed + 1
+        new_end = line + added + 1
+        if self._changed is None:
+            self._changed = line, old_end, new_end
+            return
+        i, j, k = self._changed
+        # lines from k on are lines from j on at the last call
+        self._changed = (min(i, line), j + max(old_end - k, 0),
+                         max(k, old_end) + new_end - old_end)
+
+    def changed_lines(self):
+        """Return (i, j, k) if lines i to j (exclusive) of the buffer
+        as it was at the last call have been replaced by what are now
+        lines i to k, or None if nothing has changed; lines before i
+        and from j (now k) on are as they were."""
+        changed = self._changed
+        self._changed = None
+        return changed
+
+    def insert(self, i, c):
+        n = len(self)
+        if i < 0:
+            i = max(i + n, 0)
+        self[i:i] = [c]
+
+    def append(self, c):
+        self.insert(len(self), c)
+
+    def extend(self, chars):
+        n = len(self)
+        self[n:n] = chars
+
+    def pop(self, i=-1):
+        c = self[i]
+        del self[i]
+        return c
+
+    def count(self, c):
+        if c == '\n':
+            return len(self._nl_front) + len(self._nl_back)
+        return self._front.count(c) + self._back.count(c)
+
+    def index(self, c, start=0, stop=None):
+        n = len(self)
+        start, stop, _ = slice(start, stop).indices(n)
+        if c == '\n':
+            i = self.line_end(start)
+            if i < stop:
+                return i
+            raise ValueError("%r is not in GapBuffer" % (c,))
+        front = self._front
+        k = len(front)
+        if start < k:
+            try:
+                return front.index(c, start, min(stop, k))
+            except ValueError:
+                pass
+        lo = max(start, k)
+        if lo < stop:
+            after = self._back[n - stop:n - lo]
+            after.reverse()
+            try:
+                return lo + after.index(c)
+            except ValueError:
+                pass
+        raise ValueError("%r is not in GapBuffer" % (c,))
+
+    def line_number(self, p):
+        """Return the number of newlines before position p, that is the
+        0-based number of the line p is on."""
+        p = max(0, min(p, len(self)))
+        nl_front = self._nl_front
+        if p <= len(self._front):
+            return bisect_left(nl_front, p)
+        nl_back = self._nl_back
+        j = len(self) - 1 - p
+        return len(nl_front) + len(nl_back) - bisect_right(nl_back, j)
+
+    def newline_pos(self, i):
+        """Return the position of the i-th (0-based) newline."""
+        nl_front = self._nl_front
+        if i < len(nl_front):
+            return nl_front[i]
+        nl_back = self._nl_back
+        j = nl_back[len(nl_back) - 1 - (i - len(nl_front))]
+        return len(self) - 1 - j
+
+    def line_start(self, p):
+        """Return the position just after the last newline before p,
+        or 0."""
+        i = self.line_number(p)
+        if i:
+            return self.newline_pos(i - 1) + 1
+        return 0
+
+    def line_end(self, p):
+        """Return the position of the first newline at or after p, or
+        the length of the buffer."""
+        i = self.line_number(p)
+        if i < self.count('\n'):
+            return self.newline_pos(i)
+        return len(self)
+
+    def get_text(self):
+        """Return the contents as a string.  The result is cached until
+        the next modification."""
+        if self._text is None:
+            self._text = (unicode('').join(self._front) +
+                          unicode('').join(reversed(self._back)))
+        return self._text
@@ -18,7 +18,10 @@
 # CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 from pyrepl import commands
-from pyrepl.reader import Reader as R
+from pyrepl.fuzzy import FuzzyFinder
+from pyrepl.history import History
+from pyrepl.reader import Reader as R, disp_str
+from pyrepl.unicode_width import WIDE_PAD, split_cells
 
 isearch_keymap = tuple(
     [('\\%03o' % c, 'isearch-end') for c in range(256) if chr(c) != '\\'] +
@@ -33,6 +36,21 @@ isearch_keymap = tuple(
      (r'\C-g', 'isearch-cancel'),
      (r'\<backspace>', 'isearch-backspace')])
 
+fuzzy_keymap = tuple(
+    [('\\%03o' % c, 'fuzzy-end') for c in range(256) if chr(c) != '\\'] +
+    [(c, 'fuzzy-add-character')
+     for c in map(chr, range(32, 127)) if c != '\\'] +
+    [('\\%03o' % c, 'fuzzy-add-character')
+     for c in range(256) if chr(c).isalpha() and chr(c) != '\\'] +
+    [('\\\\', 'fuzzy-add-character'),
+     (r'\C-n', 'fuzzy-next'),
+     (r'\<down>', 'fuzzy-next'),
+     (r'\C-p', 'fuzzy-previous'),
+     (r'\<up>', 'fuzzy-previous'),
+     (r'\C-c', 'fuzzy-cancel'),
+     (r'\C-g', 'fuzzy-cancel'),
+     (r'\<backspace>', 'fuzzy-backspace')])
+
 if 'c' in globals():
     del c
 
@@ -177,6 +195,39 @@ class isearch_backwards(commands.Command):
         r.isearch_next()
 
 
+class paste(commands.paste):
+    def do(self):
+        # pastes are not keys, so the translators of the search modes
+        # don't see them; what is pasted there goes into the query
+        r = self.reader
+        if r.isearch_direction != ISEARCH_DIRECTION_NONE:
+            r.isearch_term += self.text()
+            r.dirty = 1
+            p = r.pos
+            if u''.join(r.buffer[p:p + len(r.isearch_term)]) != \
+                    r.isearch_term:
+                r.isearch_next()
+        elif r.fuzzy_finder is not None:
+            for c in self.text():
+                r.fuzzy_finder.add(c)
+            r.fuzzy_selected = 0
+            r.fuzzy_update()
+            if not r.fuzzy_matches:
+                r.error("not found")
+        else:
+            commands.paste.do(self)
+
+
+class accept_suggestion(commands.right):
+    def do(self):
+        r = self.reader
+        suggestion = r.get_suggestion()
+        if suggestion:
+            r.insert(suggestion)
+        else:
+            commands.right.do(self)
+
+
 class isearch_end(commands.Command):
     def do(self):
         r = self.reader
@@ -186,22 +237,142 @@ class isearch_end(commands.Command):
         r.dirty = 1
 
 
+class fuzzy_history_search(commands.Command):
+    def do(self):
+        r = self.reader
+        r.fuzzy_finder = FuzzyFinder(r.history)
+        r.fuzzy_start = r.get_unicode(), r.pos
+        r.fuzzy_selected = 0
+        r.push_input_trans(r.fuzzy_trans)
+        r.fuzzy_update()
+
+
+class fuzzy_add_character(commands.Command):
+    def do(self):
+        r = self.reader
+        r.fuzzy_finder.add(self.event[-1])
+        r.fuzzy_selected = 0
+        r.fuzzy_update()
+        if not r.fuzzy_matches:
+            r.error("not found")
+
+
+class fuzzy_backspace(commands.Command):
+    def do(self):
+        r = self.reader
+        if r.fuzzy_finder.query:
+            r.fuzzy_finder.back()
+            r.fuzzy_selected = 0
+            r.fuzzy_update()
+        else:
+            r.error("nothing to rubout")
+
+
+class fuzzy_next(commands.Command):
+    def do(self):
+        r = self.reader
+        if r.fuzzy_selected + 1 >= len(r.fuzzy_matches):
+            r.error("no more matches")
+            return
+        r.fuzzy_selected += 1
+        r.fuzzy_update()
+
+
+class fuzzy_previous(commands.Command):
+    def do(self):
+        r = self.reader
+        if r.fuzzy_selected == 0:
+            r.error("no more matches")
+            return
+        r.fuzzy_selected -= 1
+        r.fuzzy_update()
+
+
+class fuzzy_cancel(commands.Command):
+    def do(self):
+        r = self.reader
+        r.buffer = list(r.fuzzy_start[0])
+        r.pos = r.fuzzy_start[1]
+        r.fuzzy_finder = None
+        r.pop_input_trans()
+        r.dirty = 1
+
+
+class fuzzy_end(commands.Command):
+    def do(self):
+        r = self.reader
+        r.fuzzy_finder = None
+        r.console.forgetinput()
+        r.pop_input_trans()
+        r.dirty = 1
+
+
+def _fit(item, room):
+    """Return the first line of item as displayed, cut to room
+    columns."""
+    cells = split_cells(disp_str(item.split('\n', 1)[0])[0])[:room + 1]
+    if 0 <= room < len(cells) and cells[room] == WIDE_PAD:
+        room -= 1
+    return ''.join(cells[:max(room, 0)])
+
+
 class HistoricalReader(R):
     """Adds history support (with incremental history searching) to the
     Reader class.
 
     Adds the following instance variables:
       * history:
-        a list of strings
+        a list of strings; lists assigned to it are converted to
+        history_class, a list subclass that can be searched quickly
+        and that subclasses can limit the size of (see History).
+        Anything else with a find_item() method, such as an
+        SQLiteHistory, is used as it is.
       * historyi:
+      * history_file:
+        a HistoryFile shared with other sessions, which accepted lines
+        are appended to as they are entered, or None
       * transient_history:
       * next_history:
       * isearch_direction, isearch_term, isearch_start:
       * yank_arg_i, yank_arg_yanked:
         used by the yank-arg command; not actually manipulated by any
         HistoricalReader instance methods.
+      * fuzzy_finder, fuzzy_matches, fuzzy_selected, fuzzy_start:
+        the state of fuzzy-history-search, which lists the
+        fuzzy_menu_size history items that match what is typed best,
+        taking into account how often and how recently they were
+        used, below the line (see FuzzyFinder)
+      * autosuggest:
+        if true, the rest of the newest history item that starts with
+        the buffer is shown, dimmed by suggestion_style, after the
+        cursor when it is at the end of the buffer; right or C-f
+        accepts it.  This needs a history with find_prefix().
     """
 
+    history_class = History
+    history_file = None
+    fuzzy_menu_size = 10
+    autosuggest = False
+    suggestion_style = '\x1b[2m', '\x1b[0m'
+
+    def _get_history(self):
+        return self._history
+
+    def _set_history(self, items):
+        if not hasattr(items, 'find_item'):
+            items = self.history_class(items)
+        self._history = items
+        self._index_history()
+
+    def _index_history(self):
+        # building the index autosuggestions search takes a while for
+        # a long history, so it is done when the history is loaded
+        # rather than on the next keystroke
+        if self.autosuggest and hasattr(self.history, 'index_prefixes'):
+            self.history.index_prefixes()
+
+    history = property(_get_history, _set_history)
+
     def collect_keymap(self):
         return super(HistoricalReader, self).collect_keymap() + (
             (r'\C-n', 'next-history'),
@@ -211,6 +382,9 @@ class HistoricalReader(R):
             (r'\C-s', 'forward-history-isearch'),
             (r'\M-r', 'restore-history'),
             (r'\M-.', 'yank-arg'),
+            (r'\C-x\C-r', 'fuzzy-history-search'),
+            (r'\C-f', 'accept-suggestion'),
+            (r'\<right>', 'accept-suggestion'),
             (r'\<page down>', 'last-history'),
             (r'\<page up>', 'first-history'))
 
@@ -226,13 +400,21 @@ class HistoricalReader(R):
                   forward_history_isearch, reverse_history_isearch,
                   isearch_end, isearch_add_character, isearch_cancel,
                   isearch_add_character, isearch_backspace,
-                  isearch_forwards, isearch_backwards, operate_and_get_next]:
+                  isearch_forwards, isearch_backwards, operate_and_get_next,
+                  accept_suggestion, fuzzy_history_search,
+                  fuzzy_add_character, fuzzy_backspace, fuzzy_next,
+                  fuzzy_previous, fuzzy_cancel, fuzzy_end, paste]:
             self.commands[c.__name__] = c
             self.commands[c.__name__.replace('_', '-')] = c
         from pyrepl import input
         self.isearch_trans = input.KeymapTranslator(
             isearch_keymap, invalid_cls=isearch_end,
             character_cls=isearch_add_character)
+        self.fuzzy_finder = None
+        self.fuzzy_matches = []
+        self.fuzzy_trans = input.KeymapTranslator(
+            fuzzy_keymap, invalid_cls=fuzzy_end,
+            character_cls=fuzzy_add_character)
 
     def select_item(self, i):
         self.transient_history[self.historyi] = self.get_unicode()
@@ -254,6 +436,13 @@ class HistoricalReader(R):
         super(HistoricalReader, self).prepare()
         try:
             self.transient_history = {}
+            if self.history_file is not None:
+                new = self.history_file.read_new()
+                if new is None:
+                    self.history = self.history_file.load()
+                else:
+                    self.history.extend(new)
+            self._index_history()
             if self.next_history is not None and \
                     self.next_history < len(self.history):
                 self.historyi = self.next_history
@@ -271,36 +460,126 @@ class HistoricalReader(R):
         if cursor_on_line and self.isearch_direction != ISEARCH_DIRECTION_NONE:
             d = 'rf'[self.isearch_direction == ISEARCH_DIRECTION_FORWARDS]
             return "(%s-search `%s') " % (d, self.isearch_term)
+        if cursor_on_line and self.fuzzy_finder is not None:
+            return "(fuzzy `%s') " % self.fuzzy_finder.query
         return super(HistoricalReader, self).get_prompt(lineno, cursor_on_line)
 
+    def after_command(self, cmd):
+        super(HistoricalReader, self).after_command(cmd)
+        if self.finished and self.autosuggest:
+            # the accepted line is shown without a suggestion
+            self.dirty = 1
+
+    def get_suggestion(self):
+        """Return what the autosuggestion adds to the buffer, or ''."""
+        if (not self.autosuggest or self.finished or not self.buffer or
+                self.pos != len(self.buffer) or
+                self.isearch_direction != ISEARCH_DIRECTION_NONE or
+                self.fuzzy_finder is not None or
+                not hasattr(self.history, 'find_prefix')):
+            return ''
+        s = self.get_unicode()
+        i = self.history.find_prefix(s, len(self.history))
+        if i is None:
+            return ''
+        return self.history[i][len(s):]
+
+    def fuzzy_update(self):
+        """Show the best matches for the query of fuzzy-history-search,
+        and the one selected in the buffer."""
+        finder = self.fuzzy_finder
+        self.fuzzy_matches = [finder.entries[i]
+                              for i in finder.best(self.fuzzy_menu_size)]
+        if self.fuzzy_matches:
+            self.buffer = list(self.fuzzy_matches[self.fuzzy_selected])
+        else:
+            self.buffer = list(self.fuzzy_start[0])
+        self.pos = len(self.buffer)
+        self.dirty = 1
+
+    def calc_screen(self):
+        screen = super(HistoricalReader, self).calc_screen()
+        x, y = self.cxy
+        w = self.console.width - 1
+        if self.fuzzy_finder is not None:
+            # a line for each match below the cursor's, which is at the
+            # end of the buffer
+            menu = [('> ' if i == self.fuzzy_selected else '  ') +
+                    _fit(item, w - 2)
+                    for i, item in enumerate(self.fuzzy_matches)]
+            self.insert_screen_rows(screen, y + 1, menu)
+            return screen
+        suggestion = self.get_suggestion()
+        if suggestion:
+            # as much of its first line as fits after the cursor
+            text = _fit(suggestion, w - x)
+            if text:
+                start, end = self.suggestion_style
+                y -= self.screen_top
+                screen[y] = screen[y] + start + text + end
+        return screen
+
     def isearch_next(self):
         st = self.isearch_term
         p = self.pos
-        i = self.historyi
         s = self.get_unicode()
         forwards = self.isearch_direction == ISEARCH_DIRECTION_FORWARDS
+        if forwards:
+            p = s.find(st, p + 1)
+        else:
+            p = s.rfind(st, 0, p + len(st) - 1)
+        if p != -1:
+            self.pos = p
+            self.dirty = 1
+            return
+        i = self.find_item(st, self.historyi, forwards)
+        if i is None:
+            self.error("not found")
+            return
+        s = self.get_item(i)
+        self.select_item(i)
+        if forwards:
+            self.pos = s.find(st)
+        else:
+            self.pos = s.rfind(st)
+
+    def find_item(self, st, i, forwards):
+        """Return the index of the nearest history item after (or
+        before) i containing st, taking edits that have not been
+        accepted yet into account, or None."""
+        history = self.history
+        transient = self.transient_history
         while 1:
+            j = history.find_item(st, i, forwards)
+            # items edited since, between i and j, are searched as
+            # they are now
             if forwards:
-                p = s.find(st, p + 1)
-            else:
-                p = s.rfind(st, 0, p + len(st) - 1)
-            if p != -1:
-                self.select_item(i)
-                self.pos = p
-                return
-            elif ((forwards and i == len(self.history) - 1)
-                  or (not forwards and i == 0)):
-                self.error("not found")
-                return
+                edited = sorted(k for k in transient
+                                if i < k < len(history) and
+                                (j is None or k <= j))
             else:
-                if forwards:
-                    i += 1
-                    s = self.get_item(i)
-                    p = -1
-                else:
-                    i -= 1
-                    s = self.get_item(i)
-                    p = len(s)
+                edited = sorted((k for k in transient
+                                 if k < i and (j is None or k >= j)),
+                                reverse=True)
+            for k in edited:
+                if st in transient[k]:
+                    return k
+            if j is None or j not in transient:
+                return j
+            i = j
+
+    def add_history(self, entry):
+        """Append entry to the history, and to history_file if there
+        is one.  Return the indices of the entries the history dropped
+        to make room, as History.append does."""
+        if self.history_file is not None:
+            new = self.history_file.append(entry)
+            if new is None:
+                # the file was replaced; it has everything, entry too
+                self.history = self.history_file.load()
+                return []
+            self.history.extend(new)
+        return self.history.append(entry)
 
     def finish(self):
         super(HistoricalReader, self).finish()
@@ -308,8 +587,13 @@ class HistoricalReader(R):
         for i, t in self.transient_history.items():
             if i < len(self.history) and i != self.historyi:
                 self.history[i] = t
-        if ret:
-            self.history.append(ret)
+        if not ret:
+            return
+        removed = self.add_history(ret)
+        if removed and self.next_history is not None:
+            # the history may have dropped entries to make room
+            self.next_history -= len([i for i in removed
+                                      if i < self.next_history])
 
 
 def test():
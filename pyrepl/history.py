@@ -0,0 +1,776 @@
+"""The history of a HistoricalReader, with an index for searching it.
+
+History is a list of strings, so everything that has historically
+treated ``reader.history`` as a list keeps working.  In addition it
+can find the nearest entry before or after a given one containing a
+string, which is what incremental search does on every keystroke.
+
+For that the entries are joined, a block of BLOCK entries at a time
+and with a separator between them, into one string per block that
+str.find and str.rfind scan at C speed; the offsets of the entries in
+a block map a match back to an entry.  Blocks are built when a search
+first needs them and are discarded when entries in them change, so
+appending to the history, the common case, only costs the last block
+being joined again the next time it is searched.
+
+History can also keep its size down: identical entries share one
+string object, a policy can keep duplicates out (ignoring a line the
+same as the previous one, or erasing the older copy), and the number
+of entries and of characters in them can be capped, the oldest entries
+going first.  Indexing stays that of a list.
+
+For autosuggestions History finds the newest entry starting with a
+given prefix in a PrefixIndex, the entries sorted, which is built by
+index_prefixes() (or else the first time it is needed) and kept up to
+date as lines are appended.
+
+LazyHistory is a History that decodes the entries of a history file
+as they are needed, newest first, so that a long history doesn't
+delay the first prompt.
+
+HistoryFile keeps a history in a file that several sessions share:
+each accepted line is appended to it as it is entered, and every
+session picks up what the others appended since it last looked.
+"""
+
+import errno
+import os
+import re
+import sys
+from bisect import bisect_left, bisect_right
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    _intern = intern    # Python 2
+
+# never part of a search term, so matches can't span entries
+SEP = u'\x00'
+# sorts after anything a prefix can be followed by
+_MAX_CHAR = u'\U0010ffff'
+
+
+def _intern_entry(entry):
+    # so that the copies of an entry share the memory for it
+    if type(entry) is str:
+        return _intern(entry)
+    return entry
+
+
+class PrefixIndex(object):
+    """The entries of a history sorted, to find the newest one that
+    starts with a given prefix without looking at all of them.
+
+    Entries are kept with a stamp each, numbers that grow with the
+    position of the entry in the history, as (entry, stamp) pairs in
+    sorted blocks of up to 2 * LOAD, and the largest stamp of each
+    block is remembered.  The entries starting with a prefix are a run
+    of pairs found by bisection; the newest of them has the largest
+    stamp in the run, which max() finds from the largest stamps of the
+    blocks the run covers and the stamps in the partial blocks at
+    either end.
+    """
+
+    LOAD = 512
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        load = self.LOAD
+        self._pairs = [pairs[i:i + load] for i in range(0, len(pairs), load)]
+        self._stamps = [[stamp for entry, stamp in block]
+                        for block in self._pairs]
+        self._firsts = [block[0] for block in self._pairs]
+        self._maxes = [max(stamps) for stamps in self._stamps]
+
+    def _find(self, pair):
+        b = max(bisect_right(self._firsts, pair) - 1, 0)
+        return b, bisect_left(self._pairs[b], pair)
+
+    def add(self, entry, stamp):
+        pair = entry, stamp
+        if not self._pairs:
+            self.__init__([pair])
+            return
+        b, k = self._find(pair)
+        block, stamps = self._pairs[b], self._stamps[b]
+        block.insert(k, pair)
+        stamps.insert(k, stamp)
+        if k == 0:
+            self._firsts[b] = pair
+        if stamp > self._maxes[b]:
+            self._maxes[b] = stamp
+        if len(block) > 2 * self.LOAD:
+            half = len(block) // 2
+            self._pairs[b + 1:b + 1] = [block[half:]]
+            self._stamps[b + 1:b + 1] = [stamps[half:]]
+            self._firsts.insert(b + 1, block[half])
+            self._maxes.insert(b + 1, max(stamps[half:]))
+            del block[half:], stamps[half:]
+            self._maxes[b] = max(stamps)
+
+    def remove(self, entry, stamp):
+        pair = entry, stamp
+        b, k = self._find(pair)
+        block, stamps = self._pairs[b], self._stamps[b]
+        if block[k:k + 1] != [pair]:
+            raise ValueError("%r is not in the index" % (pair,))
+        del block[k], stamps[k]
+        if not block:
+            del self._pairs[b], self._stamps[b]
+            del self._firsts[b], self._maxes[b]
+            return
+        if k == 0:
+            self._firsts[b] = block[0]
+        if stamp == self._maxes[b]:
+            self._maxes[b] = max(stamps)
+
+    def newest(self, prefix):
+        """Return the largest stamp of the entries starting with
+        prefix, or None if there are none."""
+        if not self._pairs:
+            return None
+        lo, hi = (prefix,), (prefix + _MAX_CHAR,)
+        b1, k1 = self._find(lo)
+        b2 = bisect_left(self._firsts, hi) - 1
+        if b2 < b1:
+            return None
+        k2 = bisect_left(self._pairs[b2], hi)
+        if b1 == b2:
+            runs = [self._stamps[b1][k1:k2]]
+        else:
+            runs = [self._stamps[b1][k1:], self._maxes[b1 + 1:b2],
+                    self._stamps[b2][:k2]]
+        runs = [run for run in runs if run]
+        if not runs:
+            return None
+        return max(max(run) for run in runs)
+
+
+class History(list):
+
+    BLOCK = 1024
+
+    # what to do with an entry that is the same as one in the history
+    # already: None keeps both, 'consecutive' ignores it if it is the
+    # same as the last one, 'erase' removes the older one
+    duplicates = None
+    # how many entries, and characters in all of them, to keep at most
+    max_length = None
+    max_chars = None
+
+    def __init__(self, items=()):
+        list.__init__(self)
+        self._blocks = []       # block number -> (text, starts) or None
+        self._chars = None      # characters in the entries, if known
+        self._members = None    # the set of the entries, if known
+        # a PrefixIndex of the entries and their stamps, in the order
+        # of the entries, once index_prefixes() has built it
+        self._prefixes = self._stamps = None
+        items = [_intern_entry(item) for item in items]
+        if self.duplicates == 'erase':
+            seen = set()
+            kept = []
+            for item in reversed(items):
+                if item not in seen:
+                    seen.add(item)
+                    kept.append(item)
+            kept.reverse()
+            items = kept
+        elif self.duplicates == 'consecutive':
+            items = [item for i, item in enumerate(items)
+                     if i == 0 or item != items[i - 1]]
+        list.extend(self, items)
+        drop = self._excess()
+        if drop:
+            list.__delitem__(self, slice(0, drop))
+            self._chars = None
+
+    # -- keeping the index up to date
+
+    def _changed(self, i, j=None, indexed=False):
+        """Entries from i (up to j, if only entries were replaced)
+        have changed.  Unless indexed, when the caller updates it, the
+        prefix index is dropped."""
+        self._chars = self._members = None
+        if not indexed:
+            self._prefixes = self._stamps = None
+        blocks = self._blocks
+        n = len(blocks)
+        if i < 0:
+            i = max(i + list.__len__(self), 0)
+        first = i // self.BLOCK
+        if j is None:
+            del blocks[first:]
+        else:
+            for b in range(first, min((j - 1) // self.BLOCK + 1, n)):
+                blocks[b] = None
+
+    def _changed_slice(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(list.__len__(self))
+            if step != 1 or stop < start:
+                self._changed(0)
+            else:
+                self._changed(start)
+        else:
+            self._changed(index)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self._changed_slice(index)
+        else:
+            if index < 0:
+                index += list.__len__(self)
+            self._changed(index, index + 1, indexed=True)
+            if self._prefixes is not None:
+                stamp = self._stamps[index]
+                self._prefixes.remove(list.__getitem__(self, index), stamp)
+                self._prefixes.add(value, stamp)
+        list.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            self._changed_slice(index)
+        else:
+            if index < 0:
+                index += list.__len__(self)
+            self._changed(index, indexed=True)
+            self._unindex(index, index + 1)
+        list.__delitem__(self, index)
+
+    # Python 2 calls these for simple slices
+    def __setslice__(self, i, j, value):
+        self.__setitem__(slice(i, j), value)
+
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(i, j))
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, n):
+        self._changed(0)
+        return list.__imul__(self, n)
+
+    def append(self, entry):
+        """Add entry at the end, and remove the entries the duplicates
+        policy and the limits on the size of the history require.
+        Return the indices the removed entries had, in ascending
+        order."""
+        entry = _intern_entry(entry)
+        n = list.__len__(self)
+        if (self.duplicates is None and self.max_length is None and
+                self.max_chars is None):
+            self._changed(n, indexed=True)
+            list.append(self, entry)
+            self._index_from(n)
+            return []
+        if (self.duplicates is not None and n and
+                list.__getitem__(self, n - 1) == entry):
+            return []
+        chars, members = self._chars, self._members
+        erased = None
+        if self.duplicates == 'erase':
+            if members is None:
+                members = set(self)
+            if entry in members:
+                erased = list.index(self, entry)
+                self._changed(erased, indexed=True)
+                self._unindex(erased, erased + 1)
+                list.__delitem__(self, erased)
+                if chars is not None:
+                    chars -= len(entry)
+            members.add(entry)
+        self._changed(list.__len__(self), indexed=True)
+        list.append(self, entry)
+        self._index_from(list.__len__(self) - 1)
+        if chars is not None:
+            chars += len(entry)
+        self._chars, self._members = chars, members
+        removed = []
+        drop = self._excess()
+        if drop:
+            dropped = list.__getitem__(self, slice(0, drop))
+            self._changed(0, indexed=True)
+            self._unindex(0, drop)
+            list.__delitem__(self, slice(0, drop))
+            if chars is not None:
+                chars -= sum(map(len, dropped))
+            if members is not None:
+                members.difference_update(dropped)
+            self._chars, self._members = chars, members
+            if erased is not None and erased < drop:
+                drop += 1
+            removed = [i for i in range(drop) if i != erased]
+        if erased is not None:
+            removed.append(erased)
+            removed.sort()
+        return removed
+
+    def _excess(self):
+        """Return how many of the oldest entries are over the limits."""
+        n = list.__len__(self)
+        drop = 0
+        if self.max_length is not None:
+            drop = max(n - self.max_length, 0)
+        if self.max_chars is not None:
+            if self._chars is None:
+                self._chars = sum(map(len, self))
+            chars = self._chars
+            for i in range(drop):
+                chars -= len(list.__getitem__(self, i))
+            # the newest entry is kept whatever its size
+            while chars > self.max_chars and drop < n - 1:
+                chars -= len(list.__getitem__(self, drop))
+                drop += 1
+        return drop
+
+    def extend(self, items):
+        if (self.duplicates is None and self.max_length is None and
+                self.max_chars is None):
+            n = list.__len__(self)
+            self._changed(n, indexed=True)
+            list.extend(self, map(_intern_entry, items))
+            self._index_from(n)
+        else:
+            for item in items:
+                self.append(item)
+
+    def insert(self, i, item):
+        self._changed(min(i, list.__len__(self)))
+        list.insert(self, i, item)
+
+    def pop(self, i=-1):
+        self._changed(i)
+        return list.pop(self, i)
+
+    def remove(self, item):
+        self._changed(self.index(item))
+        list.remove(self, item)
+
+    def clear(self):
+        del self[:]
+
+    def reverse(self):
+        self._changed(0)
+        list.reverse(self)
+
+    def sort(self, *args, **kw):
+        self._changed(0)
+        list.sort(self, *args, **kw)
+
+    def _index_from(self, i):
+        """Add the entries from i, which were just appended, to the
+        prefix index."""
+        if self._prefixes is None:
+            return
+        stamp = self._stamps[-1] + 1 if self._stamps else 0
+        for entry in list.__getitem__(self, slice(i, None)):
+            self._prefixes.add(entry, stamp)
+            self._stamps.append(stamp)
+            stamp += 1
+
+    def _unindex(self, i, j):
+        """Remove the entries from i up to j, which are about to be
+        deleted, from the prefix index."""
+        if self._prefixes is None:
+            return
+        stamps = self._stamps
+        for k in range(i, j):
+            self._prefixes.remove(list.__getitem__(self, k), stamps[k])
+        del stamps[i:j]
+
+    # -- searching
+
+    def _block(self, b):
+        blocks = self._blocks
+        if b >= len(blocks):
+            blocks.extend([None] * (b + 1 - len(blocks)))
+        block = blocks[b]
+        if block is None:
+            items = list.__getitem__(
+                self, slice(b * self.BLOCK, (b + 1) * self.BLOCK))
+            starts = []
+            offset = 0
+            for item in items:
+                starts.append(offset)
+                offset += len(item) + 1
+            block = blocks[b] = SEP.join(items), starts
+        return block
+
+    def find_item(self, term, i, forwards=True):
+        """Return the index of the first entry after i (or the last one
+        before i, if not forwards) that contains term, or None."""
+        n = list.__len__(self)
+        if SEP in term:
+            if forwards:
+                indices = range(max(i + 1, 0), n)
+            else:
+                indices = range(min(i, n) - 1, -1, -1)
+            for j in indices:
+                if term in list.__getitem__(self, j):
+                    return j
+            return None
+        size = self.BLOCK
+        if forwards:
+            i = max(i + 1, 0)
+            if i >= n:
+                return None
+            for b in range(i // size, (n - 1) // size + 1):
+                text, starts = self._block(b)
+                k = i - b * size
+                p = text.find(term, starts[k] if k > 0 else 0)
+                if p != -1:
+                    return b * size + bisect_right(starts, p) - 1
+        else:
+            i = min(i, n) - 1
+            for b in range(i // size, -1, -1):
+                text, starts = self._block(b)
+                k = i - b * size
+                end = len(text)
+                if k + 1 < len(starts):
+                    end = starts[k + 1] - 1
+                p = text.rfind(term, 0, end)
+                if p != -1:
+                    return b * size + bisect_right(starts, p) - 1
+        return None
+
+    def index_prefixes(self):
+        """Build the index find_prefix() uses, if it isn't built; it
+        is kept up to date as entries are appended and removed.  This
+        takes a while for a long history, so readers do it before the
+        first keystroke needs it."""
+        if self._prefixes is None:
+            self._stamps = list(range(list.__len__(self)))
+            self._prefixes = PrefixIndex(
+                zip(list.__getitem__(self, slice(None)), self._stamps))
+
+    def find_prefix(self, prefix, i, forwards=False):
+        """Return the index of the last entry before i (or the first
+        one after i, if forwards) that starts with prefix, or None.
+
+        The newest entry, searching back from the end, is found in the
+        prefix index (see index_prefixes()); other searches look at the
+        entries one by one."""
+        n = list.__len__(self)
+        if not forwards and i >= n:
+            self.index_prefixes()
+            stamp = self._prefixes.newest(prefix)
+            if stamp is None:
+                return None
+            return bisect_left(self._stamps, stamp)
+        if forwards:
+            indices = range(max(i + 1, 0), n)
+        else:
+            indices = range(min(i, n) - 1, -1, -1)
+        for j in indices:
+            if list.__getitem__(self, j).startswith(prefix):
+                return j
+        return None
+
+
+class LazyHistory(History):
+    """A History of the records in the contents of a history file,
+    which decodes only the newest `eager` of them up front.
+
+    The older entries are decoded `chunk` at a time as they are
+    indexed, which is what moving back through the history does, and
+    all at once by anything else that needs them: searching, iterating,
+    changing entries other than by appending, or a duplicates policy
+    or size limit set on a subclass.  Until then they are kept as the
+    bytes they were read as.
+    """
+
+    eager = 1000
+    chunk = 4096
+
+    def __init__(self, data, decode, sep=b'\n'):
+        """data holds records separated by sep, which decode() turns
+        into entries; a separator at the end of data is ignored."""
+        History.__init__(self)
+        end = len(data)
+        if data.endswith(sep):
+            end -= len(sep)
+        self._data = data
+        self._decode = decode
+        self._sep = sep
+        self._end = end         # where the undecoded records end
+        # how many entries, the first ones, are still undecoded
+        self._pending = data.count(sep, 0, end) + 1 if data else 0
+        if (self.duplicates is not None or self.max_length is not None
+                or self.max_chars is not None):
+            # these need all the entries
+            self._materialise()
+            History.__init__(self, list.__getitem__(self, slice(None)))
+        else:
+            self._load_back(self.eager)
+
+    def _load_back(self, n):
+        """Decode the last n of the entries still undecoded."""
+        n = min(n, self._pending)
+        if not n:
+            return
+        data, sep, end = self._data, self._sep, self._end
+        if n == self._pending:
+            start = 0
+        else:
+            start = end
+            for _ in range(n):
+                start = data.rfind(sep, 0, start)
+            self._end = start
+            start += len(sep)
+        entries = [self._decode(record)
+                   for record in data[start:end].split(sep)]
+        list.__setitem__(self, slice(0, 0), entries)
+        self._pending -= n
+        if not self._pending:
+            self._data = None
+
+    def _materialise(self):
+        self._load_back(self._pending)
+
+    def __len__(self):
+        return self._pending + list.__len__(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self._materialise()
+            return list.__getitem__(self, index)
+        if index < 0:
+            index += len(self)
+        if 0 <= index < self._pending:
+            self._load_back(max(self._pending - index, self.chunk))
+        elif index < 0:
+            raise IndexError("list index out of range")
+        return list.__getitem__(self, index - self._pending)
+
+    def append(self, entry):
+        if (self.duplicates is not None or self.max_length is not None
+                or self.max_chars is not None):
+            self._materialise()
+        return History.append(self, entry)
+
+
+def _materialising(name):
+    method = getattr(History, name)
+
+    def wrapper(self, *args, **kw):
+        self._materialise()
+        return method(self, *args, **kw)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+for _name in ['__setitem__', '__delitem__', '__iter__', '__reversed__',
+              '__contains__', '__eq__', '__ne__', '__lt__', '__le__',
+              '__gt__', '__ge__', '__add__', '__mul__', '__rmul__',
+              '__iadd__', '__imul__', '__repr__', '__reduce_ex__',
+              'extend', 'insert', 'pop', 'remove', 'index', 'count',
+              'reverse', 'sort', 'copy', 'find_item', 'find_prefix',
+              'index_prefixes',
+              # Python 2
+              '__getslice__', '__setslice__', '__delslice__']:
+    if hasattr(History, _name):
+        setattr(LazyHistory, _name, _materialising(_name))
+del _name
+
+
+def _unescape(s):
+    if u'\\' not in s:
+        return s
+    return re.sub(u'\\\\(.)',
+                  lambda m: u'\n' if m.group(1) == u'n' else m.group(1), s)
+
+
+class HistoryFile(object):
+    """A history file that sessions append to as lines are entered.
+
+    Every append is a single write() under an exclusive flock(), and
+    reads happen under a shared one, so the file always consists of
+    whole records.  Each session remembers the inode and the size of
+    the file when it last read it: what is past that offset was added
+    by other sessions since.  Once the file has grown to twice its
+    size after the last compaction (or by max_length records, if that
+    is less), it is compacted: duplicates are dropped, keeping the
+    newest, the oldest entries beyond max_length are dropped too, and
+    the result replaces the file atomically.  Sessions notice that the
+    inode changed, and load the file again.
+
+    By default each record is an entry encoded in UTF-8, with
+    backslashes and newlines in it escaped; subclasses can change that
+    by overriding encode() and decode().
+    """
+
+    # records appended before the first compaction of a small file
+    compact_slack = 1000
+
+    def __init__(self, filename, max_length=None):
+        self.filename = os.path.expanduser(filename)
+        self.max_length = max_length
+        self.inode = None
+        self.offset = 0
+        self.count = 0      # records in the file
+        self.base = 0       # records after the last compaction
+
+    def encode(self, entry):
+        """Return entry as bytes, not including the final newline."""
+        entry = entry.replace(u'\\', u'\\\\').replace(u'\n', u'\\n')
+        return entry.encode('utf-8')
+
+    def decode(self, data):
+        """Return the entries in data, which consists of whole
+        records."""
+        return [_unescape(line.decode('utf-8', 'replace'))
+                for line in data.split(b'\n') if line]
+
+    def _open(self, flags, lock):
+        # the file may be replaced by a compaction between opening and
+        # locking it, in which case the new one is opened instead
+        while 1:
+            try:
+                fd = os.open(self.filename, flags, 0o600)
+            except OSError as e:
+                if e.errno == errno.ENOENT and not flags & os.O_CREAT:
+                    return None
+                raise
+            if fcntl is not None:
+                fcntl.flock(fd, lock)
+            try:
+                if os.stat(self.filename).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except OSError:
+                pass
+            os.close(fd)
+
+    def _read(self, fd, start):
+        size = os.fstat(fd).st_size
+        os.lseek(fd, start, 0)
+        chunks = []
+        while start < size:
+            data = os.read(fd, size - start)
+            if not data:
+                break
+            chunks.append(data)
+            start += len(data)
+        return b''.join(chunks)
+
+    def _read_new(self, fd):
+        st = os.fstat(fd)
+        if self.inode is None:
+            # the file didn't exist, so all of it is new
+            self.inode = st.st_ino
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            return None
+        data = self._read(fd, self.offset)
+        self.offset += len(data)
+        entries = self.decode(data)
+        self.count += len(entries)
+        return entries
+
+    def load(self):
+        """Return the entries in the file."""
+        self.inode = None
+        self.offset = self.count = self.base = 0
+        fd = self._open(os.O_RDONLY, fcntl and fcntl.LOCK_SH)
+        if fd is None:
+            return []
+        try:
+            data = self._read(fd, 0)
+            self.inode = os.fstat(fd).st_ino
+        finally:
+            os.close(fd)
+        self.offset = len(data)
+        entries = self.decode(data)
+        self.count = self.base = len(entries)
+        return entries
+
+    def read_new(self):
+        """Return the entries other sessions appended since the file
+        was last read, or None if it has been replaced since and needs
+        to be loaded again."""
+        fd = self._open(os.O_RDONLY, fcntl and fcntl.LOCK_SH)
+        if fd is None:
+            # if it has gone, so has everything read from it
+            return None if self.inode is not None else []
+        try:
+            return self._read_new(fd)
+        finally:
+            os.close(fd)
+
+    def append(self, entry):
+        """Append entry to the file.  Return the entries other
+        sessions appended before it, as read_new() does, or None if
+        the file has to be loaded again (which can be because this
+        append compacted it)."""
+        fd = self._open(os.O_RDWR | os.O_APPEND | os.O_CREAT,
+                        fcntl and fcntl.LOCK_EX)
+        try:
+            new = self._read_new(fd)
+            record = self.encode(entry) + b'\n'
+            size = os.fstat(fd).st_size
+            if size:
+                # files written in one go may not end with a newline
+                os.lseek(fd, size - 1, 0)
+                if os.read(fd, 1) != b'\n':
+                    record = b'\n' + record
+            os.write(fd, record)
+            if new is not None:
+                self.offset = size + len(record)
+                self.count += 1
+                if self.count >= self.base + self._slack():
+                    self._compact(fd)
+                    new = None
+        finally:
+            os.close(fd)
+        return new
+
+    def _slack(self):
+        slack = max(self.base, self.compact_slack)
+        if self.max_length is not None and self.max_length >= 0:
+            slack = min(slack, self.max_length + 1)
+        return slack
+
+    def compact(self):
+        """Drop duplicates and entries beyond max_length from the
+        file now."""
+        fd = self._open(os.O_RDWR | os.O_CREAT, fcntl and fcntl.LOCK_EX)
+        try:
+            self._compact(fd)
+        finally:
+            os.close(fd)
+
+    def _compact(self, fd):
+        entries = self.decode(self._read(fd, 0))
+        seen = set()
+        kept = []
+        for entry in reversed(entries):
+            if entry not in seen:
+                seen.add(entry)
+                kept.append(entry)
+        if self.max_length is not None and self.max_length >= 0:
+            del kept[self.max_length:]
+        kept.reverse()
+        data = b''.join([self.encode(entry) + b'\n' for entry in kept])
+        tmp = '%s.%d.tmp' % (self.filename, os.getpid())
+        out = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                      os.fstat(fd).st_mode & 0o777)
+        try:
+            while data:
+                data = data[os.write(out, data):]
+            os.fsync(out)
+            os.rename(tmp, self.filename)
+        except:
+            os.close(out)
+            os.unlink(tmp)
+            raise
+        st = os.fstat(out)
+        os.close(out)
+        self.inode = st.st_ino
+        self.offset = st.st_size
+        self.count = self.base = len(kept)
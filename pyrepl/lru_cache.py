@@ -0,0 +1,40 @@
+"""A small least-recently-used mapping, usable on all the Python
+versions pyrepl supports (functools.lru_cache is Python 3 only and
+memoizes functions rather than giving us a mapping)."""
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        data = self.data
+        try:
+            value = data.pop(key)
+        except KeyError:
+            return default
+        data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        data = self.data
+        data.pop(key, None)
+        data[key] = value
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self.data.pop(key, default)
+
+    def clear(self):
+        self.data.clear()
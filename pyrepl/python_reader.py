@@ -24,12 +24,18 @@ from __future__ import print_function
 from __future__ import unicode_literals
 from pyrepl.completing_reader import CompletingReader
 from pyrepl.historical_reader import HistoricalReader
+from pyrepl.history import History, HistoryFile, LazyHistory
 from pyrepl import completing_reader, reader
 from pyrepl import commands, completer
 from pyrepl import module_lister
 import types, sys, os, re, code, traceback
 import atexit, warnings
 
+try:
+    from pyrepl.sqlite_history import SQLiteHistory
+except ImportError:
+    SQLiteHistory = None
+
 try:
     unicode
 except:
@@ -83,7 +89,28 @@ from_line_prog = re.compile(
 import_line_prog = re.compile(
     r"^(?:import|from)\s+(?P<mod>[A-Za-z_.0-9]*)\s*$")
 
+class PythonHistoryFile(HistoryFile):
+    """The format of ~/.pythoni.hist: one entry per line, escaped with
+    unicode_escape."""
+
+    def encode(self, entry):
+        return entry.encode('unicode_escape')
+
+    def decode(self, data):
+        return [decode_history_line(x) for x in data.split(b'\n') if x]
+
+
+def decode_history_line(line):
+    try:
+        return line.decode('unicode_escape')
+    except UnicodeDecodeError:
+        return line.decode('latin-1')
+
+
 def saver(reader=reader):
+    if reader.history_file is not None:
+        # everything has been written already
+        return
     try:
         with open(os.path.expanduser("~/.pythoni.hist"), "wb") as fp:
             fp.write(b'\n'.join(item.encode('unicode_escape')
@@ -96,6 +123,16 @@ class PythonicReader(CompletingReader, HistoricalReader):
 
     _module_list_ready = False
 
+    # if set, and sqlite3 is available, the history is kept in this
+    # SQLite database instead of ~/.pythoni.hist, and written as it
+    # is entered rather than at exit
+    history_db = None
+
+    # if true, lines are appended to ~/.pythoni.hist as they are
+    # entered, and other sessions doing the same see them, instead of
+    # the file being rewritten at exit
+    append_history = False
+
     def collect_keymap(self):
         return super(PythonicReader, self).collect_keymap() + (
             (r'\n', 'maybe-accept'),
@@ -113,23 +150,35 @@ class PythonicReader(CompletingReader, HistoricalReader):
             self.compiler = CommandCompiler()
         else:
             self.compiler = compiler
-        try:
-            file = open(os.path.expanduser("~/.pythoni.hist"), 'rb')
-        except IOError:
-            self.history = []
-        else:
-            try:
-                lines = file.readlines()
-                self.history = [ x.rstrip(b'\n').decode('unicode_escape') for x in lines]
-            except:
-                self.history = []
+        if self.history_db is not None and SQLiteHistory is not None:
+            self.history = SQLiteHistory(self.history_db)
+            self.historyi = len(self.history)
+            atexit.register(self.history.close)
+        elif self.append_history:
+            self.history_file = PythonHistoryFile("~/.pythoni.hist")
+            self.history = self.history_file.load()
             self.historyi = len(self.history)
-            file.close()
-        atexit.register(lambda: saver(self))
+        else:
+            self.load_history()
+            atexit.register(lambda: saver(self))
         for c in [maybe_accept]:
             self.commands[c.__name__] = c
             self.commands[c.__name__.replace('_', '-')] = c        
     
+    def load_history(self):
+        try:
+            with open(os.path.expanduser("~/.pythoni.hist"), 'rb') as file:
+                data = file.read()
+        except IOError:
+            self.history = []
+            return
+        # decoding every line takes a while with a long history, so
+        # only the lines being used are
+        self.history = LazyHistory(data, decode_history_line)
+        if self.history_class is not History:
+            self.history = list(self.history)
+        self.historyi = len(self.history)
+
     def get_completions(self, stem):
         b = self.get_unicode()
         m = import_line_prog.match(b)
@@ -158,8 +207,7 @@ class PythonicReader(CompletingReader, HistoricalReader):
                 return [x[len(mod) + 1:]
                         for x in l if x.startswith(mod + '.' + name)]
         try:
-            l = sorted(set(self.completer.complete(stem)))
-            return l
+            return self.completer.complete(stem)
         except (NameError, AttributeError):
             return []
 
@@ -20,9 +20,15 @@
 # CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
 
 from __future__ import unicode_literals
+import time
 import unicodedata
 from pyrepl import commands
 from pyrepl import input
+from pyrepl.gap_buffer import GapBuffer
+from pyrepl.lru_cache import LRUCache
+from pyrepl.row_index import RowIndex
+from pyrepl.unicode_width import (WIDE_PAD, _is_plain, char_width,
+                                  split_cells)
 try:
     unicode
 except NameError:
@@ -35,14 +41,14 @@ def _make_unctrl_map():
     for i in range(256):
         c = unichr(i)
         if unicodedata.category(c)[0] != 'C':
-            uc_map[i] = c
+            uc_map[c] = c
     for i in range(32):
-        uc_map[i] = '^' + unichr(ord('A') + i - 1)
-    uc_map[ord(b'\t')] = '    '  # display TABs as 4 characters
-    uc_map[ord(b'\177')] = unicode('^?')
+        uc_map[unichr(i)] = '^' + unichr(ord('A') + i - 1)
+    uc_map['\t'] = '    '  # display TABs as 4 characters
+    uc_map['\177'] = unicode('^?')
     for i in range(256):
-        if i not in uc_map:
-            uc_map[i] = unicode('\\%03o') % i
+        if unichr(i) not in uc_map:
+            uc_map[unichr(i)] = unicode('\\%03o') % i
     return uc_map
 
 
@@ -56,7 +62,14 @@ def _my_unctrl(c, u=_make_unctrl_map()):
             return c
 
 
-def disp_str(buffer, join=''.join, uc=_my_unctrl):
+# recent results of disp_str; lines longer than _DISP_CACHE_LINE_MAX
+# are rare and cheap to recompute relative to their size
+_disp_cache = LRUCache(1024)
+_DISP_CACHE_LINE_MAX = 1000
+_join = ''.join
+
+
+def disp_str(buffer, join=_join, uc=_my_unctrl):
     """ disp_str(buffer:string) -> (string, [int])
 
     Return the string that should be the printed represenation of
@@ -66,21 +79,79 @@ def disp_str(buffer, join=''.join, uc=_my_unctrl):
     >>> disp_str(chr(3))
     ('^C', [1, 0])
 
-    the list always contains 0s or 1s at present; it could conceivably
-    go higher as and when unicode support happens."""
-    # disp_str proved to be a bottleneck for large inputs,
-    # so it needs to be rewritten in C; it's not required though.
-    s = [uc(x) for x in buffer]
-    b = []  # XXX: bytearray
-    for x in s:
-        b.append(1)
-        b.extend([0] * (len(x) - 1))
+    The printed representation has one character per terminal column:
+    double-width characters are followed by WIDE_PAD (a 0 in the list).
+    Zero-width characters share the column of the character before
+    them, composed with it where possible and following it otherwise,
+    and are counted in its entry (so entries can be greater than 1).
+
+    Results are memoized, so the returned list must not be modified."""
+    if not isinstance(buffer, unicode):
+        buffer = join(buffer)
+    if join is not _join or uc is not _my_unctrl:
+        # the cache only holds what the defaults produce
+        return _disp_str(buffer, join, uc)
+    result = _disp_cache.get(buffer)
+    if result is not None:
+        return result
+    if _is_plain(buffer):
+        # the common case: printable ASCII is displayed unchanged
+        result = buffer, [1] * len(buffer)
+    else:
+        result = _disp_str(buffer, join, uc)
+    if len(buffer) <= _DISP_CACHE_LINE_MAX:
+        _disp_cache[buffer] = result
+    return result
+
+
+def _disp_str(buffer, join, uc):
+    s = []
+    b = []
+    # index in b of the entry for the last character shown as itself,
+    # or -1 if the last one shown was escaped
+    last = -1
+    for x in buffer:
+        if last >= 0 and not char_width(x):
+            # zero-width: shown in the column of the character before it
+            cell = s[-1]
+            if len(cell) == 1 and \
+                    len(unicodedata.normalize('NFC', cell + x)) == 1:
+                s[-1] = unicodedata.normalize('NFC', cell + x)
+            elif cell[-1:] == WIDE_PAD:
+                s[-1] = cell[:-1] + x + WIDE_PAD
+            else:
+                s[-1] = cell + x
+            b[last] += 1
+            continue
+        d = uc(x)
+        if d != x:
+            # a control character, shown escaped
+            last = -1
+            s.append(d)
+            b.append(1)
+            b.extend([0] * (len(d) - 1))
+            continue
+        w = char_width(x)
+        if w == 1:
+            last = len(b)
+            s.append(x)
+            b.append(1)
+        elif w == 2:
+            last = len(b)
+            s.append(x + WIDE_PAD)
+            b.extend((1, 0))
+        else:
+            # a zero-width character with nothing before it to go with
+            d = r'\x%04x' % ord(x)
+            last = -1
+            s.append(d)
+            b.append(1)
+            b.extend([0] * (len(d) - 1))
     return join(s), b
 
-del _my_unctrl
-
 del _make_unctrl_map
 
+
 # syntax classes:
 
 [SYNTAX_WHITESPACE,
@@ -177,8 +248,10 @@ class Reader(object):
     Instance variables of note include:
 
       * buffer:
-        A *list* (*not* a string at the moment :-) containing all the
-        characters that have been entered.
+        A list-like object (an instance of `buffer_class', a GapBuffer
+        by default) containing all the characters that have been
+        entered.  Assigning any sequence of characters to it replaces
+        the contents.
       * console:
         Hopefully encapsulates the OS dependent stuff.
       * pos:
@@ -189,6 +262,11 @@ class Reader(object):
         insertion point around reasonably efficiently.  I'd like to
         get rid of it, because its contents are obtuse (to put it
         mildly) but I haven't worked out if that is possible yet.
+      * screen_top, screen_rows:
+        The screen calc_screen returns (and screeninfo) can be just
+        the rows around the cursor: these are the row of the whole
+        screen its first row is, and how many rows the whole screen
+        has.
       * cxy, lxy:
         the position of the insertion point in screen ... XXX
       * syntax_table:
@@ -231,6 +309,30 @@ feeling more loquacious than I am now."""
 
     msg_at_bottom = True
 
+    # how many rows beyond the console's window around the cursor
+    # (see Console.get_window_height) are built anyway
+    layout_margin = 8
+
+    # while more input is already waiting, the screen is not redrawn
+    # after every command, but it is redrawn at least this often (in
+    # seconds) so that it never lags far behind the typing; 0 redraws
+    # after every command
+    typeahead_delay = 0.05
+
+    # the text storage used for self.buffer; anything with the
+    # interface of GapBuffer will do
+    buffer_class = GapBuffer
+
+    def _get_buffer(self):
+        return self._buffer
+
+    def _set_buffer(self, chars):
+        if not isinstance(chars, self.buffer_class):
+            chars = self.buffer_class(chars)
+        self._buffer = chars
+
+    buffer = property(_get_buffer, _set_buffer)
+
     def __init__(self, console):
         self.buffer = []
         self.ps1 = "->> "
@@ -243,6 +345,19 @@ feeling more loquacious than I am now."""
         self.console = console
         self.commands = {}
         self.msg = ''
+        # what is kept about each logical line of self.buffer between
+        # calls to calc_screen: its prompt, its layout (None if it has
+        # not been laid out) and, in a RowIndex, its number of rows
+        self._lines_buffer = None   # the buffer they are for
+        self._layout_width = None
+        self._prompts = []
+        self._layouts = []
+        self._rows = RowIndex()
+        self._cursor_line = 0
+        self._middle_prompt = None
+        # (y, n) for each insert_screen_rows() since calc_screen
+        self._inserted = []
+        self._refresh_due = None
         for v in vars(commands).values():
             if (isinstance(v, type) and
                     issubclass(v, commands.Command) and
@@ -262,51 +377,250 @@ feeling more loquacious than I am now."""
 
     def calc_screen(self):
         """The purpose of this method is to translate changes in
-        self.buffer into changes in self.screen.  Currently it rips
-        everything down and starts from scratch, which whilst not
-        especially efficient is certainly simple(r).
+        self.buffer into changes in self.screen.  The prompts, layouts
+        and numbers of rows of the logical lines are kept from one
+        call to the next, and only the lines the buffer reports as
+        changed, or whose prompt changed, are laid out again, so the
+        time taken doesn't grow with the size of the buffer.  Rows too
+        far from the cursor to be displayed (see
+        Console.get_window_height) are not returned at all (see
+        screen_top and screen_rows), and the lines they show are not
+        laid out, only their rows counted.
         """
-        lines = self.get_unicode().split("\n")
-        screen = []
-        screeninfo = []
-        w = self.console.width - 1
-        p = self.pos
-        for ln, line in zip(range(len(lines)), lines):
-            ll = len(line)
-            if 0 <= p <= ll:
-                if self.msg and not self.msg_at_bottom:
-                    for mline in self.msg.split("\n"):
-                        screen.append(mline)
-                        screeninfo.append((0, []))
-                self.lxy = p, ln
-            prompt = self.get_prompt(ln, ll >= p >= 0)
-            while '\n' in prompt:
-                pre_prompt, _, prompt = prompt.partition('\n')
-                screen.append(pre_prompt)
-                screeninfo.append((0, []))
-            p -= ll + 1
-            prompt, lp = self.process_prompt(prompt)
-            l, l2 = disp_str(line)
-            wrapcount = (len(l) + lp) // w
-            if wrapcount == 0:
-                screen.append(prompt + l)
-                screeninfo.append((lp, l2 + [1]))
-            else:
-                screen.append(prompt + l[:w - lp] + "\\")
-                screeninfo.append((lp, l2[:w - lp]))
-                for i in range(-lp + w, -lp + wrapcount * w, w):
-                    screen.append(l[i:i + w] + "\\")
-                    screeninfo.append((0, l2[i:i + w]))
-                screen.append(l[wrapcount * w - lp:])
-                screeninfo.append((0, l2[wrapcount * w - lp:] + [1]))
-        self.screeninfo = screeninfo
+        cursor_ln = self._update_lines()
+        self._inserted = []
+        self.lxy = self.pos - self._line_start(cursor_ln), cursor_ln
         self.cxy = self.pos2xy(self.pos)
+        self.screen_top, screen, self.screeninfo, self.screen_rows = \
+            self._build_screen(cursor_ln, self.cxy[1])
+        if self.msg and not self.msg_at_bottom:
+            self.insert_screen_rows(screen, self._rows.start(cursor_ln),
+                                    self.msg.split("\n"))
         if self.msg and self.msg_at_bottom:
-            for mline in self.msg.split("\n"):
-                screen.append(mline)
-                screeninfo.append((0, []))
+            mlines = self.msg.split("\n")
+            if self.screen_top + len(screen) == self.screen_rows:
+                screen.extend(mlines)
+                self.screeninfo.extend([(0, [])] * len(mlines))
+            self.screen_rows += len(mlines)
         return screen
 
+    def insert_screen_rows(self, screen, y, rows):
+        """Insert rows that show no part of the buffer, such as a menu,
+        into screen (as returned by calc_screen) before row y of the
+        whole screen.  The cursor, and pos2xy and xy2pos, take them
+        into account."""
+        top = self.screen_top
+        if y < top:
+            # above the rows returned, which move down
+            self.screen_top = top + len(rows)
+        elif y <= top + len(screen):
+            screen[y - top:y - top] = rows
+            self.screeninfo[y - top:y - top] = [(0, [])] * len(rows)
+        self.screen_rows += len(rows)
+        self._inserted.append((y, len(rows)))
+        x, cy = self.cxy
+        if cy >= y:
+            self.cxy = x, cy + len(rows)
+
+    def _update_lines(self):
+        """Bring what is kept about each logical line up to date with
+        the buffer, and return the number of the cursor's line."""
+        buffer = self.buffer
+        changed = buffer.changed_lines()
+        w = self.console.width - 1
+        n = buffer.count("\n") + 1
+        cursor_ln = buffer.line_number(self.pos)
+        # lines other than the first, the last and the cursor's all get
+        # the same prompt, which only needs looking at once
+        middle = self.get_prompt(1, False) if n > 2 else None
+        if (buffer is not self._lines_buffer or w != self._layout_width or
+                (middle is not None and self._middle_prompt is not None and
+                 middle != self._middle_prompt)):
+            self._lines_buffer = buffer
+            self._layout_width = w
+            self._prompts = []
+            self._layouts = []
+            self._rows = RowIndex()
+            self._set_lines(0, 0, self.get_unicode().split("\n"), cursor_ln)
+        else:
+            # the lines whose prompt may have changed, by their numbers
+            # before the change
+            old = [len(self._prompts) - 1, self._cursor_line]
+            start = end = 0
+            if changed is not None:
+                start, j, end = changed
+                self._set_lines(start, j, self._line_texts(start, end),
+                                cursor_ln)
+                old = [ln + end - j if ln >= j else ln for ln in old]
+            for ln in set(old + [0, n - 1, cursor_ln]):
+                if (0 <= ln < n and not start <= ln < end and
+                        self.get_prompt(ln, ln == cursor_ln)
+                        != self._prompts[ln]):
+                    self._set_lines(ln, ln + 1, self._line_texts(ln, ln + 1),
+                                    cursor_ln)
+        if middle is not None:
+            self._middle_prompt = middle
+        self._cursor_line = cursor_ln
+        return cursor_ln
+
+    def _build_screen(self, cursor_ln, cy):
+        """Return the first row, the rows and their screeninfo entries
+        of the part of the screen near enough to the cursor, row cy of
+        line cursor_ln, to be displayed, and the number of rows of the
+        whole screen."""
+        near = self._near
+        screen = []
+        screeninfo = []
+        if near is None:
+            for ln in range(len(self._layouts)):
+                layout = self._layout_of(ln)
+                screen.extend(layout[0])
+                screeninfo.extend(layout[1])
+            return 0, screen, screeninfo, len(screen)
+        total = self._rows.total()
+        top = max(cy - near, 0)
+        bottom = min(cy + near + 1, total)
+        # back from the cursor's line to the one row top is on; the
+        # lines passed over are displayed anyway
+        ln = cursor_ln
+        y = self._rows.start(ln)
+        while y > top:
+            ln -= 1
+            y -= len(self._layout_of(ln)[0])
+        r = top - y
+        y = top
+        while y < bottom:
+            rows, info = self._layout_of(ln)
+            if r or y + len(rows) > bottom:
+                rows = rows[r:r + bottom - y]
+                info = info[r:r + bottom - y]
+            screen.extend(rows)
+            screeninfo.extend(info)
+            y += len(rows)
+            ln += 1
+            r = 0
+        return top, screen, screeninfo, total
+
+    @property
+    def _near(self):
+        # the console shows a window of this many rows around the
+        # cursor, so rows further away than that are not going to be
+        # displayed and lines not near it only need the right number
+        # of rows
+        window = self.console.get_window_height()
+        if window is None:
+            return None
+        return window + self.layout_margin
+
+    def _set_lines(self, i, j, lines, cursor_ln):
+        """Replace what is kept about lines i to j (exclusive) by the
+        prompts, layouts and numbers of rows of lines, which are the
+        text of the lines from i on now."""
+        w = self._layout_width
+        near = self._near
+        prompts = []
+        layouts = []
+        counts = []
+        for ln, line in enumerate(lines, i):
+            prompt = self.get_prompt(ln, ln == cursor_ln)
+            prompts.append(prompt)
+            if near is None or abs(ln - cursor_ln) <= near:
+                layout = self._layout_line(prompt, line, w)
+                layouts.append(layout)
+                counts.append(len(layout[0]))
+            else:
+                # laid out if it comes close enough to be displayed
+                layouts.append(None)
+                counts.append(self._count_rows(prompt, line, w))
+        self._rows.replace(i, j, counts)
+        self._prompts[i:j] = prompts
+        self._layouts[i:j] = layouts
+
+    def _line_start(self, ln):
+        if ln:
+            return self.buffer.newline_pos(ln - 1) + 1
+        return 0
+
+    def _line_texts(self, i, j):
+        """Return the text of lines i to j (exclusive)."""
+        buffer = self.buffer
+        if j <= buffer.count("\n"):
+            end = buffer.newline_pos(j - 1)
+        else:
+            end = len(buffer)
+        return "".join(buffer[self._line_start(i):end]).split("\n")
+
+    def _layout_of(self, ln):
+        """Return the layout of line ln, laying it out if it has not
+        been."""
+        layout = self._layouts[ln]
+        if layout is None:
+            layout = self._layout_line(self._prompts[ln],
+                                       self._line_texts(ln, ln + 1)[0],
+                                       self._layout_width)
+            self._layouts[ln] = layout
+        return layout
+
+    def _layout_line(self, prompt, line, w):
+        """Return the screen lines and the screeninfo entries for one
+        logical line of the buffer, wrapped to width w."""
+        screen = []
+        screeninfo = []
+        while '\n' in prompt:
+            pre_prompt, _, prompt = prompt.partition('\n')
+            screen.append(pre_prompt)
+            screeninfo.append((0, []))
+        prompt, lp = self.process_prompt(prompt)
+        l, l2 = self._columns(line)
+        start = 0
+        for end in self._row_ends(l, lp, w):
+            screen.append(prompt + ''.join(l[start:end]) + "\\")
+            screeninfo.append((lp, l2[start:end]))
+            prompt, lp = '', 0
+            start = end
+        screen.append(prompt + ''.join(l[start:]))
+        screeninfo.append((lp, l2[start:] + [1]))
+        return screen, screeninfo
+
+    def _columns(self, line):
+        """Return disp_str(line), with the string split into columns
+        if some of them hold more than one character."""
+        l, l2 = disp_str(line)
+        if len(l) != len(l2):
+            # some columns hold zero-width characters too
+            l = split_cells(l)
+        return l, l2
+
+    def _row_ends(self, l, lp, w):
+        """Return the indices in the columns l at which rows of width
+        w end when lp columns of the first are taken by the prompt,
+        but for the last row."""
+        ends = []
+        start = 0
+        room = max(w - lp, 1)
+        while len(l) - start >= room:
+            end = start + room
+            if end < len(l) and l[end] == WIDE_PAD and end - 1 > start:
+                # don't split a double-width character across rows
+                end -= 1
+            ends.append(end)
+            start = end
+            room = w
+        return ends
+
+    def _count_rows(self, prompt, line, w):
+        """Return the number of rows _layout_line would give line,
+        without making them."""
+        pre_rows = prompt.count('\n')
+        prompt, lp = self.process_prompt(prompt.rpartition('\n')[2])
+        room = max(w - lp, 1)
+        if not _is_plain(line):
+            l, l2 = self._columns(line)
+            return pre_rows + len(self._row_ends(l, lp, w)) + 1
+        if len(line) < room:
+            return pre_rows + 1
+        return pre_rows + 2 + (len(line) - room) // w
+
     def process_prompt(self, prompt):
         """ Process the prompt.
 
@@ -370,14 +684,9 @@ feeling more loquacious than I am now."""
         immediately.
 
         p defaults to self.pos."""
-        # XXX there are problems here.
         if p is None:
             p = self.pos
-        b = self.buffer
-        p -= 1
-        while p >= 0 and b[p] != '\n':
-            p -= 1
-        return p + 1
+        return self.buffer.line_start(max(p, 0))
 
     def eol(self, p=None):
         """Return the 0-based index of the line break following p most
@@ -386,10 +695,7 @@ feeling more loquacious than I am now."""
         p defaults to self.pos."""
         if p is None:
             p = self.pos
-        b = self.buffer
-        while p < len(b) and b[p] != '\n':
-            p += 1
-        return p
+        return self.buffer.line_end(p)
 
     def get_arg(self, default=1):
         """Return any prefix argument that the user has supplied,
@@ -405,6 +711,7 @@ feeling more loquacious than I am now."""
         `lineno'."""
         if self.arg is not None and cursor_on_line:
             return "(arg: %s) " % self.arg
+        # both of these are O(1) thanks to the buffer's newline index
         if "\n" in self.buffer:
             if lineno == 0:
                 res = self.ps2
@@ -430,33 +737,62 @@ feeling more loquacious than I am now."""
 
     def pos2xy(self, pos):
         """Return the x, y coordinates of position 'pos'."""
-        # this *is* incomprehensible, yes.
-        y = 0
         assert 0 <= pos <= len(self.buffer)
-        if pos == len(self.buffer):
-            y = len(self.screeninfo) - 1
-            p, l2 = self.screeninfo[y]
-            return p + len(l2) - 1, y
+        self._update_lines()
+        ln = self.buffer.line_number(pos)
+        pos -= self._line_start(ln)
+        y = self._rows.start(ln)
+        for p, l2 in self._layout_of(ln)[1]:
+            n = sum(l2)
+            if pos < n:
+                break
+            pos -= n
+            y += 1
+        c = 0
+        i = 0
+        while c < pos:
+            c += l2[i]
+            i += 1
+        if c > pos:
+            # pos is inside a character with zero-width ones after it
+            i -= 1
         else:
-            for p, l2 in self.screeninfo:
-                l = l2.count(1)
-                if l > pos:
-                    break
-                else:
-                    pos -= l
-                    y += 1
-            c = 0
-            i = 0
-            while c < pos:
-                c += l2[i]
-                i += 1
             while l2[i] == 0:
                 i += 1
-            return p + i, y
+        for y0, n in self._inserted:
+            if y >= y0:
+                y += n
+        return p + i, y
+
+    def xy2pos(self, x, y):
+        """Return the position in the buffer of the character displayed
+        at screen coordinates x, y; the inverse of pos2xy.  Coordinates
+        off the end of a line map to the end of that line."""
+        for y0, n in reversed(self._inserted):
+            if y >= y0 + n:
+                y -= n
+            elif y >= y0:
+                # an inserted row: the start of the row after it
+                y, x = y0, 0
+        self._update_lines()
+        y = max(0, min(y, self._rows.total() - 1))
+        ln, r = self._rows.find(y)
+        pos = self._line_start(ln)
+        rows = self._layout_of(ln)[1]
+        for p, l2 in rows[:r]:
+            pos += sum(l2)
+        p, l2 = rows[r]
+        if l2:
+            i = max(0, min(x - p, len(l2) - 1))
+            while i and l2[i] == 0:
+                # the second column of a double-width character
+                i -= 1
+            pos += sum(l2[:i])
+        return min(pos, len(self.buffer))
 
     def insert(self, text):
         """Insert 'text' at the insertion point."""
-        self.buffer[self.pos:self.pos] = list(text)
+        self.buffer[self.pos:self.pos] = text
         self.pos += len(text)
         self.dirty = 1
 
@@ -480,12 +816,16 @@ feeling more loquacious than I am now."""
             self.console.prepare()
             self.arg = None
             self.screeninfo = []
+            self.screen_top = self.screen_rows = 0
             self.finished = 0
             del self.buffer[:]
             self.pos = 0
             self.dirty = 1
             self.last_command = None
             self._pscache = {}
+            self._refresh_due = None
+            # the prompts may be different this time
+            self._lines_buffer = None
         except:
             self.restore()
             raise
@@ -516,8 +856,24 @@ feeling more loquacious than I am now."""
         """Recalculate and refresh the screen."""
         # this call sets up self.cxy, so call it first.
         screen = self.calc_screen()
-        self.console.refresh(screen, self.cxy)
+        if self.console.get_window_height() is None:
+            self.console.refresh(screen, self.cxy)
+        else:
+            self.console.refresh(screen, self.cxy, self.screen_top,
+                                 self.screen_rows)
         self.dirty = 0  # forgot this for a while (blush)
+        self._refresh_due = None
+
+    def defer_refresh(self):
+        """Return true if redrawing the screen should wait because
+        more input is already pending (see typeahead_delay)."""
+        delay = self.typeahead_delay
+        if not delay or not self.console.input_pending():
+            return False
+        now = time.time()
+        if self._refresh_due is None:
+            self._refresh_due = now + delay
+        return now < self._refresh_due
 
     def do_cmd(self, cmd):
         #print cmd
@@ -530,18 +886,19 @@ feeling more loquacious than I am now."""
             return  # nothing to do
 
         cmd.do()
+        self.finished = cmd.finish
 
         self.after_command(cmd)
 
         if self.dirty:
-            self.refresh()
+            if cmd.finish or not self.defer_refresh():
+                self.refresh()
         else:
             self.update_cursor()
 
         if not isinstance(cmd, commands.digit_arg):
             self.last_command = cmd.__class__
 
-        self.finished = cmd.finish
         if self.finished:
             self.console.finish()
             self.finish()
@@ -556,6 +913,10 @@ feeling more loquacious than I am now."""
             self.dirty = 1
 
         while 1:
+            if (block and self._refresh_due is not None
+                    and not self.console.input_pending()):
+                # catch up before waiting for more input
+                self.refresh()
             event = self.console.get_event(block)
             if not event:  # can only happen if we're not blocking
                 return None
@@ -620,7 +981,7 @@ feeling more loquacious than I am now."""
 
     def get_unicode(self):
         """Return the current buffer as a unicode string."""
-        return unicode('').join(self.buffer)
+        return self.buffer.get_text()
 
 
 def test():
@@ -31,6 +31,7 @@ import os
 from pyrepl import commands
 from pyrepl.historical_reader import HistoricalReader
 from pyrepl.completing_reader import CompletingReader
+from pyrepl.history import HistoryFile
 from pyrepl.unix_console import UnixConsole, _error
 
 try:
@@ -180,9 +181,52 @@ class maybe_accept(commands.Command):
             self.finish = 1
 
 
+class ReadlineHistoryFile(HistoryFile):
+    """The format of write_history_file(): one entry per line, with
+    \r\n rather than \n ending the lines of multiline entries."""
+
+    def encode(self, entry):
+        try:
+            entry = entry.encode(ENCODING)
+        except UnicodeEncodeError:   # bah, silently fall back...
+            entry = entry.encode('utf-8')
+        return entry.replace(b'\n', b'\r\n')
+
+    def decode(self, data):
+        try:
+            lines = data.decode(ENCODING).split(u'\n')
+        except UnicodeDecodeError:
+            lines = [self.decode_line(line) for line in data.split(b'\n')]
+        if b'\r' not in data:
+            return [line for line in lines if line]
+        entries = []
+        buffer = []
+        for line in lines:
+            if line.endswith(u'\r'):
+                buffer.append(line[:-1])
+                continue
+            if buffer:
+                buffer.append(line)
+                line = u'\n'.join(buffer)
+                del buffer[:]
+            if line:
+                entries.append(line)
+        return entries
+
+    def decode_line(self, line):
+        try:
+            return line.decode(ENCODING)
+        except UnicodeDecodeError:   # bah, silently fall back...
+            return line.decode('utf-8', 'replace')
+
+
 class _ReadlineWrapper(object):
     reader = None
     saved_history_length = -1
+    # if true, read_history_file() makes the reader append lines to
+    # the file as they are entered, sharing it with other sessions,
+    # and write_history_file() only compacts it
+    append_history = False
     startup_hook = None
     config = ReadlineConfig()
 
@@ -251,6 +295,8 @@ class _ReadlineWrapper(object):
 
     def set_history_length(self, length):
         self.saved_history_length = length
+        if self.reader is not None and self.reader.history_file is not None:
+            self.reader.history_file.max_length = length
 
     def get_current_history_length(self):
         return len(self.get_reader().history)
@@ -260,22 +306,27 @@ class _ReadlineWrapper(object):
         # are actually continuations inside a single multiline_input()
         # history item: we use \r\n instead of just \n.  If the history
         # file is passed to GNU readline, the extra \r are just ignored.
-        history = self.get_reader().history
-        f = open(os.path.expanduser(filename), 'r')
-        buffer = []
-        for line in f:
-            if line.endswith('\r\n'):
-                buffer.append(line)
-            else:
-                line = self._histline(line)
-                if buffer:
-                    line = ''.join(buffer).replace('\r', '') + line
-                    del buffer[:]
-                if line:
-                    history.append(line)
-        f.close()
+        reader = self.get_reader()
+        if self.append_history:
+            entries = list(reader.history)
+            reader.history_file = ReadlineHistoryFile(
+                filename, self.saved_history_length)
+            reader.history = reader.history_file.load()
+            # the history is loaded from the file again when it is
+            # compacted, so what is only in memory goes into it too
+            for entry in entries:
+                reader.add_history(entry)
+            return
+        with open(os.path.expanduser(filename), 'rb') as f:
+            data = f.read()
+        reader.history.extend(ReadlineHistoryFile(filename).decode(data))
 
     def write_history_file(self, filename='~/.history'):
+        history_file = self.get_reader().history_file
+        if (history_file is not None and
+                history_file.filename == os.path.expanduser(filename)):
+            history_file.compact()
+            return
         maxlength = self.saved_history_length
         history = self.get_reader().get_trimmed_history(maxlength)
         f = open(os.path.expanduser(filename), 'w')
@@ -318,7 +369,7 @@ class _ReadlineWrapper(object):
             # blame readline.c for raising ValueError
 
     def add_history(self, line):
-        self.get_reader().history.append(self._histline(line))
+        self.get_reader().add_history(self._histline(line))
 
     def set_startup_hook(self, function=None):
         self.startup_hook = function
@@ -0,0 +1,99 @@
+"""How many screen rows each logical line of a Reader's buffer takes.
+
+The reader needs to go from a line to the row it starts on, and from a
+row to the line it belongs to, and only ever changes the counts of a
+few lines at a time.  The counts are kept in blocks of up to 2 * LOAD
+with the sum of each block, so both take time proportional to the
+number of blocks plus the size of one, rather than to the number of
+lines, and so does replacing some of the counts.
+"""
+
+
+class RowIndex(object):
+
+    LOAD = 256
+
+    def __init__(self, counts=()):
+        self._blocks = []   # the counts, in blocks
+        self._sums = []     # the sum of each block
+        self._lens = []     # the length of each block
+        self._set_blocks(0, 0, list(counts))
+
+    def _set_blocks(self, b, b2, counts):
+        """Replace blocks b to b2 (exclusive) by counts, split up."""
+        load = self.LOAD
+        if len(counts) > 2 * load:
+            blocks = [counts[i:i + load]
+                      for i in range(0, len(counts), load)]
+        elif counts:
+            blocks = [counts]
+        else:
+            blocks = []
+        self._blocks[b:b2] = blocks
+        self._sums[b:b2] = [sum(block) for block in blocks]
+        self._lens[b:b2] = [len(block) for block in blocks]
+
+    def __len__(self):
+        return sum(self._lens)
+
+    def total(self):
+        """Return the number of rows of all the lines."""
+        return sum(self._sums)
+
+    def _locate(self, i):
+        """Return the block line i is in and its index in it; a line
+        just past the end is at the end of the last block."""
+        for b, n in enumerate(self._lens):
+            if i < n:
+                return b, i
+            i -= n
+        if not self._lens:
+            return 0, 0
+        return len(self._lens) - 1, self._lens[-1] + i
+
+    def __getitem__(self, i):
+        b, k = self._locate(i)
+        return self._blocks[b][k]
+
+    def start(self, i):
+        """Return the number of rows before line i."""
+        if not self._blocks:
+            return 0
+        b, k = self._locate(i)
+        return sum(self._sums[:b]) + sum(self._blocks[b][:k])
+
+    def find(self, y):
+        """Return the line row y is on and how many rows of it come
+        before y.  Rows past the end are on the last line."""
+        i = 0
+        for b, total in enumerate(self._sums):
+            if y < total or b == len(self._sums) - 1:
+                break
+            y -= total
+            i += self._lens[b]
+        else:
+            return 0, y
+        block = self._blocks[b]
+        for k, n in enumerate(block):
+            if y < n or k == len(block) - 1:
+                return i + k, y
+            y -= n
+
+    def replace(self, i, j, counts):
+        """Replace the counts of lines i to j (exclusive) by counts."""
+        if not self._blocks:
+            self._set_blocks(0, 0, list(counts))
+            return
+        b, k = self._locate(i)
+        b2, k2 = self._locate(j)
+        if b == b2:
+            block = self._blocks[b]
+            block[k:k2] = counts
+            if len(block) > 2 * self.LOAD or not block:
+                self._set_blocks(b, b + 1, block)
+            else:
+                self._sums[b] = sum(block)
+                self._lens[b] = len(block)
+        else:
+            self._set_blocks(b, b2 + 1, self._blocks[b][:k] + list(counts) +
+                             self._blocks[b2][k2:])
@@ -0,0 +1,217 @@
+"""A history kept in an SQLite database rather than in memory.
+
+SQLiteHistory can be used as a HistoricalReader's history instead of a
+History: it supports the same indexing, appending and deleting, and
+find_item(), so incremental search works on it too.  Each change is
+written to the database as it happens, so there is nothing to save at
+exit, and entries are read in pages of page_size as they are needed,
+keeping the cache_pages most recently used ones.  Opening a history
+therefore costs the same however long it is.
+
+The entries are numbered densely by a ``pos`` column, so indexing is a
+lookup in the primary key index; deleting entries renumbers the ones
+after them, which is rare.  When SQLite has the FTS5 extension with
+the trigram tokenizer, searches for three characters or more use a
+full-text index; otherwise, and for shorter terms, they scan the table
+with instr(), in SQLite rather than in Python.
+"""
+
+import os
+import sqlite3
+
+from pyrepl.history import _MAX_CHAR
+from pyrepl.lru_cache import LRUCache
+
+_schema = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    pos INTEGER UNIQUE NOT NULL,
+    line TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS entries_line ON entries (line);
+"""
+
+_fts_schema = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    line, content='entries', content_rowid='id',
+    tokenize='trigram case_sensitive 1');
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts (rowid, line) VALUES (new.id, new.line);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, line)
+        VALUES ('delete', old.id, old.line);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE OF line ON entries
+BEGIN
+    INSERT INTO entries_fts (entries_fts, rowid, line)
+        VALUES ('delete', old.id, old.line);
+    INSERT INTO entries_fts (rowid, line) VALUES (new.id, new.line);
+END;
+"""
+
+
+class SQLiteHistory(object):
+
+    page_size = 256
+    cache_pages = 64
+    # how many entries around the current one searches look at before
+    # resorting to the indexes
+    scan_window = 2048
+
+    def __init__(self, filename, timeout=5.0):
+        if filename != ':memory:':
+            filename = os.path.expanduser(filename)
+        self.db = sqlite3.connect(filename, timeout=timeout)
+        with self.db:
+            self.db.executescript(_schema)
+            try:
+                self.db.executescript(_fts_schema)
+            except sqlite3.OperationalError:
+                # no FTS5, or no trigram tokenizer
+                self.fts = False
+            else:
+                self.fts = True
+        self._pages = LRUCache(self.cache_pages)
+        self._len = self._count()
+
+    def close(self):
+        self.db.close()
+
+    def _count(self):
+        return self.db.execute(
+            "SELECT coalesce(max(pos) + 1, 0) FROM entries").fetchone()[0]
+
+    def _page(self, n):
+        page = self._pages.get(n)
+        if page is None:
+            start = n * self.page_size
+            page = [line for (line,) in self.db.execute(
+                "SELECT line FROM entries WHERE pos >= ? AND pos < ? "
+                "ORDER BY pos", (start, start + self.page_size))]
+            self._pages[n] = page
+        return page
+
+    def _index(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("history index out of range")
+        return i
+
+    # -- the list interface
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return [line for (line,) in self.db.execute(
+                "SELECT line FROM entries WHERE pos >= ? AND pos < ? "
+                "ORDER BY pos", (start, stop))]
+        i = self._index(index)
+        return self._page(i // self.page_size)[i % self.page_size]
+
+    def __iter__(self):
+        for n in range((self._len + self.page_size - 1) // self.page_size):
+            for line in self._page(n):
+                yield line
+
+    def __setitem__(self, index, line):
+        if isinstance(index, slice):
+            raise TypeError("SQLiteHistory does not support "
+                            "slice assignment")
+        i = self._index(index)
+        with self.db:
+            self.db.execute("UPDATE entries SET line = ? WHERE pos = ?",
+                            (line, i))
+        page = self._pages.get(i // self.page_size)
+        if page is not None:
+            page[i % self.page_size] = line
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                for i in reversed(range(start, stop, step)):
+                    del self[i]
+                return
+        else:
+            start = self._index(index)
+            stop = start + 1
+        if stop <= start:
+            return
+        with self.db:
+            self.db.execute("DELETE FROM entries WHERE pos >= ? AND pos < ?",
+                            (start, stop))
+            # renumber in two steps, so that no two entries ever share
+            # a position
+            self.db.execute("UPDATE entries SET pos = -pos WHERE pos >= ?",
+                            (stop,))
+            self.db.execute("UPDATE entries SET pos = -pos - ? WHERE pos < 0",
+                            (stop - start,))
+        self._pages.clear()
+        self._len = self._count()
+
+    def append(self, line):
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO entries (pos, line) "
+                "SELECT coalesce(max(pos) + 1, 0), ? FROM entries", (line,))
+            pos = self.db.execute("SELECT pos FROM entries WHERE id = ?",
+                                  (cursor.lastrowid,)).fetchone()[0]
+        # other sessions may have added entries too
+        for n in range(min(self._len, pos) // self.page_size,
+                       pos // self.page_size + 1):
+            self._pages.pop(n)
+        self._len = pos + 1
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    # -- searching
+
+    def _nearest(self, i, forwards, condition, args, join="", join_args=()):
+        """Return the position of the nearest entry after (or before)
+        i for which the SQL condition holds, or None.
+
+        The scan_window entries next to i are looked at first, which
+        is quick when many entries match.  After that all the entries
+        are searched, through join, if given (a join restricting them
+        or an INDEXED BY clause), so that SQLite uses an index rather
+        than scanning the table when few match."""
+        if forwards:
+            first, rest, order = "pos > ? AND pos <= ?", "pos > ?", "ASC"
+            end = i + self.scan_window
+        else:
+            first, rest, order = "pos < ? AND pos >= ?", "pos < ?", "DESC"
+            end = i - self.scan_window
+        query = ("SELECT pos FROM entries %s WHERE %s AND %s "
+                 "ORDER BY pos %s LIMIT 1")
+        row = self.db.execute(query % ("", first, condition, order),
+                              (i, end) + args).fetchone()
+        if row is None:
+            row = self.db.execute(query % (join, rest, condition, order),
+                                  join_args + (end,) + args).fetchone()
+        return None if row is None else row[0]
+
+    def find_item(self, term, i, forwards=True):
+        """Return the index of the first entry after i (or the last one
+        before i, if not forwards) that contains term, or None."""
+        if self.fts and len(term) >= 3:
+            return self._nearest(
+                i, forwards, "instr(entries.line, ?)", (term,),
+                "JOIN entries_fts ON entries.id = entries_fts.rowid "
+                "AND entries_fts MATCH ?",
+                ('"%s"' % term.replace('"', '""'),))
+        return self._nearest(i, forwards, "instr(line, ?)", (term,))
+
+    def find_prefix(self, prefix, i, forwards=False):
+        """Return the index of the last entry before i (or the first
+        one after i, if forwards) that starts with prefix, or None."""
+        return self._nearest(i, forwards, "line >= ? AND line < ?",
+                             (prefix, prefix + _MAX_CHAR),
+                             "INDEXED BY entries_line")
@@ -0,0 +1,90 @@
+"""Display widths of characters.
+
+A screen line handed to a console is a string with one character per
+column.  A character that takes up two columns (most CJK ideographs,
+many emoji) is followed in it by WIDE_PAD, which marks the second
+column and which consoles must not output.  Zero-width characters
+(combining marks, joiners and the like) have no column of their own:
+they follow the character whose column they share, and are output
+with it.  split_cells() divides a line into its columns.
+"""
+
+import re
+import unicodedata
+
+
+# a noncharacter, so it never turns up in text we are asked to display
+WIDE_PAD = u'\uffff'
+
+# _widths[ord(c)] is 0 if the width of c has not been looked up yet,
+# and 1 + the width of c otherwise.  Filling it in lazily keeps import
+# fast while making every lookup after the first a single index.
+_widths = bytearray(0x110000)
+
+# matches strings that are displayed exactly as they are, one column
+# per character
+_is_plain = re.compile('[\x20-\x7e]*\\Z').match
+
+
+def _compute_width(c):
+    if unicodedata.combining(c) or unicodedata.category(c) in ('Mn', 'Me'):
+        return 0
+    if u'\u1160' <= c <= u'\u11ff':
+        # Hangul jungseong and jongseong join the preceding choseong
+        return 0
+    if u'\u200b' <= c <= u'\u200d' or c == u'\u2060':
+        # zero width space, non-joiner and joiner, and word joiner
+        return 0
+    if unicodedata.east_asian_width(c) in ('W', 'F'):
+        return 2
+    return 1
+
+
+def char_width(c):
+    """Return the number of columns the printable character c takes up
+    on a terminal: 0, 1 or 2."""
+    i = ord(c)
+    w = _widths[i]
+    if not w:
+        w = _widths[i] = _compute_width(c) + 1
+    return w - 1
+
+
+def str_width(s):
+    """Return the number of columns the printable string s takes up."""
+    if WIDE_PAD in s:
+        # each column is one character that is not zero-width
+        return len([c for c in s if char_width(c)])
+    return sum([char_width(c) for c in s])
+
+
+def split_cells(s):
+    """Return the screen line s with one item per column: s itself if
+    it has no zero-width characters, otherwise a list of strings, each
+    a character followed by the zero-width characters sharing its
+    column."""
+    if _is_plain(s):
+        return s
+    for c in s[1:]:
+        if not char_width(c):
+            break
+    else:
+        return s
+    cells = [s[0]]
+    for c in s[1:]:
+        if char_width(c):
+            cells.append(c)
+        else:
+            cells[-1] += c
+    return cells
+
+
+def pad_wide(s):
+    """Return s with WIDE_PAD inserted after each double-width
+    character, so that it has one character per column."""
+    for c in s:
+        if c > u'\u10ff' and char_width(c) == 2:
+            break
+    else:
+        return s
+    return u''.join([c + WIDE_PAD if char_width(c) == 2 else c for c in s])
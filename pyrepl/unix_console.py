@@ -33,7 +33,9 @@ from . import curses
 from .fancy_termios import tcgetattr, tcsetattr
 from .console import Console, Event
 from .unix_eventqueue import EventQueue
+from .lru_cache import LRUCache
 from .trace import trace
+from .unicode_width import WIDE_PAD, _is_plain, split_cells
 
 
 class InvalidTerminal(RuntimeError):
@@ -89,6 +91,9 @@ except AttributeError:
             self.fd = fd
 
         def poll(self, timeout=None):
+            # like select.poll, timeout is in milliseconds
+            if timeout is not None:
+                timeout /= 1000.0
             r, w, e = select.select([self.fd], [], [], timeout)
             return r
 
@@ -98,10 +103,30 @@ POLLIN = getattr(select, "POLLIN", None)
 required_curses_tistrings = 'bel clear cup el'
 optional_curses_tistrings = (
     'civis cnorm cub cub1 cud cud1 cud cud1 cuf '
-    'cuf1 cuu cuu1 dch dch1 hpa ich ich1 ind pad ri rmkx smkx')
+    'cuf1 cuu cuu1 dch dch1 hpa ich ich1 ind pad ri rmkx smkx cr home '
+    'il il1 dl dl1')
 
 
 class UnixConsole(Console):
+    # the most input get_event() reads at once
+    read_size = 4096
+
+    # hpa is often the cheapest way to move horizontally, but it
+    # doesn't work in windows telnet :-(
+    use_hpa = False
+
+    # draw each frame as one synchronized update (DEC private mode
+    # 2026), so that terminals which support it never show a half drawn
+    # screen; whether they do is asked in prepare()
+    synchronized_output = False
+
+    # how long to wait for the terminal to answer a query, in seconds
+    probe_timeout = 0.1
+
+    # ask the terminal to mark pasted text, so that it can be inserted
+    # in one go rather than interpreted as keystrokes
+    bracketed_paste = True
+
     def __init__(self, f_in=0, f_out=1, term=None, encoding=None):
         if encoding is None:
             encoding = sys.getdefaultencoding()
@@ -129,22 +154,11 @@ class UnixConsole(Console):
         for name in optional_curses_tistrings.split():
             setattr(self, '_' + name, _my_getstr(name, optional=1))
 
-        ## work out how we're going to sling the cursor around
-        # hpa don't work in windows telnet :-(
-        if 0 and self._hpa:
-            self.__move_x = self.__move_x_hpa
-        elif self._cub and self._cuf:
-            self.__move_x = self.__move_x_cub_cuf
-        elif self._cub1 and self._cuf1:
-            self.__move_x = self.__move_x_cub1_cuf1
-        else:
+        ## check we can sling the cursor around; __move works out the
+        ## cheapest way to do it each time
+        if not ((self._cub and self._cuf) or (self._cub1 and self._cuf1)):
             raise RuntimeError("insufficient terminal (horizontal)")
-
-        if self._cuu and self._cud:
-            self.__move_y = self.__move_y_cuu_cud
-        elif self._cuu1 and self._cud1:
-            self.__move_y = self.__move_y_cuu1_cud1
-        else:
+        if not ((self._cuu and self._cud) or (self._cuu1 and self._cud1)):
             raise RuntimeError("insufficient terminal (vertical)")
 
         if self._dch1:
@@ -161,66 +175,94 @@ class UnixConsole(Console):
         else:
             self.ich1 = None
 
-        self.__move = self.__move_short
-
         self.event_queue = EventQueue(self.input_fd, self.encoding)
         self.cursor_visible = 1
+        self.__sync = None  # whether the terminal does mode 2026, if known
+        self.__in_sync_frame = False
+
+        # bytes and write() calls it took to output the last frame
+        # (everything since the start of the last refresh)
+        self.frame_bytes = 0
+        self.frame_writes = 0
 
-    def refresh(self, screen, c_xy):
+    def refresh(self, screen, c_xy, top=0, total=None):
         # this function is still too long (over 90 lines)
         cx, cy = c_xy
+        if total is None:
+            total = top + len(screen)
+        self.frame_bytes = self.frame_writes = 0
+        if self.synchronized_output and self.__sync:
+            # the terminal shows nothing until the end of the frame, so
+            # there is no need to hide the cursor while drawing
+            self.__write_code(b'\033[?2026h')
+            self.__in_sync_frame = True
         if not self.__gone_tall:
-            while len(self.screen) < min(len(screen), self.height):
+            while len(self.screen) < min(total, self.height):
                 self.__hide_cursor()
                 self.__move(0, len(self.screen) - 1)
                 self.__write("\n")
                 self.__posxy = 0, len(self.screen)
                 self.screen.append("")
-        else:
-            while len(self.screen) < len(screen):
-                self.screen.append("")
 
-        if len(screen) > self.height:
+        if total > self.height:
             self.__gone_tall = 1
-            self.__move = self.__move_tall
 
         px, py = self.__posxy
         old_offset = offset = self.__offset
         height = self.height
 
+        # self.screen is what the terminal shows, from row old_offset
+        oldscr = self.screen + [""] * (min(total - old_offset, height) -
+                                       len(self.screen))
+
         # we make sure the cursor is on the screen, and that we're
         # using all of the screen if we can
         if cy < offset:
             offset = cy
         elif cy >= offset + height:
             offset = cy - height + 1
-        elif offset > 0 and len(screen) < offset + height:
-            offset = max(len(screen) - height, 0)
-            screen.append("")
-
-        oldscr = self.screen[old_offset:old_offset + height]
-        newscr = screen[offset:offset + height]
+        elif offset > 0 and total < offset + height:
+            offset = max(total - height, 0)
+            total += 1
+
+        # screen holds rows top to top + len(screen) only; the others
+        # are too far from the cursor to be shown, so are blank
+        newscr = [""] * min(total - offset, height)
+        start = max(top, offset)
+        end = min(top + len(screen), offset + len(newscr))
+        if start < end:
+            newscr[start - offset:end - offset] = screen[start - top:
+                                                         end - top]
 
         # use hardware scrolling if we have it.
         if old_offset > offset and self._ri:
             self.__hide_cursor()
             self.__write_code(self._cup, 0, 0)
-            self.__posxy = 0, old_offset
             for i in range(old_offset - offset):
                 self.__write_code(self._ri)
                 oldscr.pop(-1)
                 oldscr.insert(0, "")
+            # the top row of the terminal now shows line offset
+            self.__posxy = 0, offset
         elif old_offset < offset and self._ind:
             self.__hide_cursor()
             self.__write_code(self._cup, self.height - 1, 0)
-            self.__posxy = 0, old_offset + self.height - 1
             for i in range(offset - old_offset):
                 self.__write_code(self._ind)
                 oldscr.pop(0)
                 oldscr.append("")
+            self.__posxy = 0, offset + self.height - 1
+        elif old_offset != offset:
+            # nothing scrolled, so the row the cursor is on stands for
+            # another line now; put it somewhere known
+            self.__hide_cursor()
+            self.__write_code(self._cup, 0, 0)
+            self.__posxy = 0, offset
 
         self.__offset = offset
 
+        self.__shift_lines(oldscr, newscr)
+
         for y, oldline, newline, in zip(range(offset, offset + height),
                                         oldscr,
                                         newscr):
@@ -229,6 +271,9 @@ class UnixConsole(Console):
 
         y = len(newscr)
         while y < len(oldscr):
+            if not oldscr[y]:
+                y += 1
+                continue
             self.__hide_cursor()
             self.__move(0, y)
             self.__posxy = 0, y
@@ -237,15 +282,86 @@ class UnixConsole(Console):
 
         self.__show_cursor()
 
-        self.screen = screen
-        self.move_cursor(cx, cy)
+        self.screen = newscr
+        self.__move_cursor(cx, cy)
+        if self.__in_sync_frame:
+            self.__write_code(b'\033[?2026l')
+            self.__in_sync_frame = False
         self.flushoutput()
 
+    def __shift_lines(self, oldscr, newscr):
+        """If newscr is oldscr with a block of lines inserted or
+        deleted, move the lines that follow on the terminal with il or
+        dl rather than redrawing them all, and update oldscr to match.
+
+        When the screen has not gone tall, what is below the lines we
+        have drawn is assumed blank, as it is everywhere else here."""
+        n = min(len(oldscr), len(newscr))
+        p = 0
+        while p < n and oldscr[p] == newscr[p]:
+            p += 1
+        if p >= n - 1 or oldscr[p + 1:n] == newscr[p + 1:n]:
+            # at most one line changed
+            return
+        best = 0, 0
+        for k in range(1, n - p):
+            # lines inserted at p: newscr[i + k] == oldscr[i]
+            saved = 0
+            i = p
+            while i + k < n and newscr[i + k] == oldscr[i]:
+                if newscr[i + k] != oldscr[i + k]:
+                    saved += len(newscr[i + k]) + 1
+                i += 1
+            if saved > best[0] and (self.__gone_tall or
+                                    not any(oldscr[len(oldscr) - k:])):
+                best = saved, k
+            # lines deleted at p: newscr[i] == oldscr[i + k]
+            saved = 0
+            i = p
+            while i + k < n and newscr[i] == oldscr[i + k]:
+                if newscr[i] != oldscr[i]:
+                    saved += len(newscr[i]) + 1
+                i += 1
+            if saved > best[0]:
+                best = saved, -k
+        saved, k = best
+        if not k:
+            return
+        if k > 0:
+            codes = self._il, self._il1
+        else:
+            codes = self._dl, self._dl1
+        if codes[0]:
+            code = self.__code(codes[0], abs(k))
+        elif codes[1]:
+            code = self.__code(codes[1] * abs(k))
+        else:
+            return
+        y = self.__offset + p
+        if self.__cost(code) + 8 >= saved:
+            # roughly what moving there costs; not worth it
+            return
+        self.__hide_cursor()
+        self.__move(0, y)
+        self.__buffer.append((code, 1))
+        # il and dl leave the cursor at the start of the line
+        self.__posxy = 0, y
+        if k > 0:
+            oldscr[p:p] = [""] * k
+            del oldscr[-k:]
+        else:
+            del oldscr[p:p - k]
+            oldscr.extend([""] * -k)
+
     def __write_changed_line(self, y, oldline, newline, px):
         # this is frustrating; there's no reason to test (say)
         # self.dch1 inside the loop -- but alternative ways of
         # structuring this function are equally painful (I'm trying to
         # avoid writing code generators these days...)
+        text = newline
+        # from here on, oldline and newline have one item per column
+        oldline = split_cells(oldline)
+        newline = split_cells(newline)
         x = 0
         minlen = min(len(oldline), len(newline))
         #
@@ -255,102 +371,202 @@ class UnixConsole(Console):
         #XXX unicode check!
         while x < minlen and oldline[x] == newline[x] and newline[x] != '\x1b':
             x += 1
-        if oldline[x:] == newline[x+1:] and self.ich1:
+        # the shortcuts below assume one character per column, so lines
+        # with double-width or zero-width characters are rewritten from
+        # the first column that changed
+        wide = (WIDE_PAD in oldline or WIDE_PAD in newline or
+                isinstance(oldline, list) or isinstance(newline, list))
+        if wide and ((x < len(oldline) and oldline[x] == WIDE_PAD) or
+                     (x < len(newline) and newline[x] == WIDE_PAD)):
+            x -= 1
+        # what the terminal shows on this row as far as we know
+        known = ''.join(newline[:x])
+        if not wide and oldline[x:] == newline[x+1:] and self.ich1:
             if (y == self.__posxy[1] and x > self.__posxy[0] and
                     oldline[px:x] == newline[px+1:x+1]):
                 x = px
-            self.__move(x, y)
+            self.__move(x, y, known)
             self.__write_code(self.ich1)
             self.__write(newline[x])
             self.__posxy = x + 1, y
-        elif x < minlen and oldline[x + 1:] == newline[x + 1:]:
-            self.__move(x, y)
+        elif not wide and x < minlen and oldline[x + 1:] == newline[x + 1:]:
+            self.__move(x, y, known)
             self.__write(newline[x])
             self.__posxy = x + 1, y
-        elif (self.dch1 and self.ich1 and len(newline) == self.width
+        elif (not wide and self.dch1 and self.ich1
+              and len(newline) == self.width
               and x < len(newline) - 2
               and newline[x+1:-1] == oldline[x:-2]):
             self.__hide_cursor()
             self.__move(self.width - 2, y)
             self.__posxy = self.width - 2, y
             self.__write_code(self.dch1)
-            self.__move(x, y)
+            self.__move(x, y, known)
             self.__write_code(self.ich1)
             self.__write(newline[x])
             self.__posxy = x + 1, y
         else:
             self.__hide_cursor()
-            self.__move(x, y)
+            self.__move(x, y, known)
             if len(oldline) > len(newline):
                 self.__write_code(self._el)
-            self.__write(newline[x:])
+            self.__write(''.join(newline[x:]))
             self.__posxy = len(newline), y
 
         #XXX: check for unicode mess
-        if '\x1b' in newline:
+        if '\x1b' in text:
             # ANSI escape characters are present, so we can't assume
             # anything about the position of the cursor.  Moving the cursor
             # to the left margin should work to get to a known position.
-            self.move_cursor(0, y)
+            self.__move_cursor(0, y)
 
     def __write(self, text):
+        if WIDE_PAD in text:
+            text = text.replace(WIDE_PAD, '')
         self.__buffer.append((text, 0))
 
-    def __write_code(self, fmt, *args):
+    def __code(self, fmt, *args):
+        # rendering a capability means a trip through ctypes and a
+        # regex scan for padding, and the same few codes and cursor
+        # positions come up over and over, so the result is cached
+        key = fmt, args
+        code = self.__codes.get(key)
+        if code is None:
+            code = self.__codes[key] = self.__tputs(curses.tparm(fmt, *args))
+        return code
 
-        self.__buffer.append((curses.tparm(fmt, *args), 1))
+    def __write_code(self, fmt, *args):
+        self.__buffer.append((self.__code(fmt, *args), 1))
 
     def __maybe_write_code(self, fmt, *args):
         if fmt:
             self.__write_code(fmt, *args)
 
-    def __move_y_cuu1_cud1(self, y):
-        dy = y - self.__posxy[1]
-        if dy > 0:
-            self.__write_code(dy*self._cud1)
-        elif dy < 0:
-            self.__write_code((-dy)*self._cuu1)
+    def __cost(self, code):
+        return sum([len(part) for part in code if isinstance(part, bytes)])
 
-    def __move_y_cuu_cud(self, y):
-        dy = y - self.__posxy[1]
+    def __move_x(self, x, y, text):
+        """Return the cost and the codes of the cheapest way found to
+        move the cursor to column x on its row, or None if there is
+        none."""
+        px, py = self.__posxy
+        options = []
+        if px < self.width:
+            # otherwise a wrap is pending and the cursor is not quite
+            # where we think it is, so only absolute moves are safe
+            dx = x - px
+            if dx > 0:
+                if self._cuf:
+                    options.append([self.__code(self._cuf, dx)])
+                if self._cuf1:
+                    options.append([self.__code(self._cuf1 * dx)])
+                if (text is not None and y == py and x <= len(text)
+                        and _is_plain(text)):
+                    # print what is already there
+                    options.append([text[px:x]])
+            elif dx < 0:
+                if self._cub:
+                    options.append([self.__code(self._cub, -dx)])
+                if self._cub1:
+                    options.append([self.__code(self._cub1 * -dx)])
+            else:
+                options.append([])
+        # a plain carriage return works without the capability too
+        cr = self.__code(self._cr) if self._cr else "\r"
+        if x == 0:
+            options.append([cr])
+        else:
+            if self._cuf:
+                options.append([cr, self.__code(self._cuf, x)])
+            if self._cuf1:
+                options.append([cr, self.__code(self._cuf1 * x)])
+            if text is not None and x <= len(text) and _is_plain(text):
+                options.append([cr, text[:x]])
+        if self.use_hpa and self._hpa:
+            options.append([self.__code(self._hpa, x)])
+        return self.__cheapest(options)
+
+    def __move_y(self, y, py):
+        """Return the cost and the codes of the cheapest way to move
+        the cursor from row py to row y, or None if there is none."""
+        dy = y - py
+        options = []
         if dy > 0:
-            self.__write_code(self._cud, dy)
+            if self._cud:
+                options.append([self.__code(self._cud, dy)])
+            if self._cud1:
+                options.append([self.__code(self._cud1 * dy)])
         elif dy < 0:
-            self.__write_code(self._cuu, -dy)
-
-    def __move_x_hpa(self, x):
-        if x != self.__posxy[0]:
-            self.__write_code(self._hpa, x)
-
-    def __move_x_cub1_cuf1(self, x):
-        dx = x - self.__posxy[0]
-        if dx > 0:
-            self.__write_code(self._cuf1*dx)
-        elif dx < 0:
-            self.__write_code(self._cub1*(-dx))
-
-    def __move_x_cub_cuf(self, x):
-        dx = x - self.__posxy[0]
-        if dx > 0:
-            self.__write_code(self._cuf, dx)
-        elif dx < 0:
-            self.__write_code(self._cub, -dx)
-
-    def __move_short(self, x, y):
-        self.__move_x(x)
-        self.__move_y(y)
-
-    def __move_tall(self, x, y):
-        assert 0 <= y - self.__offset < self.height, y - self.__offset
-        self.__write_code(self._cup, y - self.__offset, x)
+            if self._cuu:
+                options.append([self.__code(self._cuu, -dy)])
+            if self._cuu1:
+                options.append([self.__code(self._cuu1 * -dy)])
+        else:
+            options.append([])
+        return self.__cheapest(options)
+
+    def __cheapest(self, options):
+        best = None
+        for codes in options:
+            cost = 0
+            for code in codes:
+                if isinstance(code, tuple):
+                    cost += self.__cost(code)
+                else:
+                    cost += len(code)
+            if best is None or cost < best[0]:
+                best = cost, codes
+        return best
+
+    def __move(self, x, y, text=None):
+        """Move the cursor to x, y, choosing the shortest of the
+        relative and (once the screen is full, or if there is no
+        relative one) absolute movements the terminal supports.  text, if given, is what is displayed on row
+        y, which can be reprinted to move right."""
+        px, py = self.__posxy
+        if (x, y) == (px, py):
+            return
+        # relative: vertically, then horizontally
+        options = []
+        h = self.__move_x(x, y, text)
+        v = self.__move_y(y, py)
+        if h is not None and v is not None:
+            options.append((v[0] + h[0], v[1] + h[1]))
+        if self.__gone_tall or not options:
+            # before the screen has gone tall this assumes it starts at
+            # the top of the terminal, but there is nothing else left
+            assert 0 <= y - self.__offset < self.height, y - self.__offset
+            cup = self.__code(self._cup, y - self.__offset, x)
+            options.append((self.__cost(cup), [cup]))
+            if self._home and y == self.__offset:
+                home = self.__code(self._home)
+                self.__posxy = 0, y
+                try:
+                    h = self.__move_x(x, y, None)
+                finally:
+                    self.__posxy = px, py
+                if h is not None:
+                    options.append((self.__cost(home) + h[0], [home] + h[1]))
+        cost, codes = min(options, key=lambda option: option[0])
+        for code in codes:
+            if isinstance(code, tuple):
+                self.__buffer.append((code, 1))
+            else:
+                self.__write(code)
 
-    def move_cursor(self, x, y):
+    def __move_cursor(self, x, y):
         if y < self.__offset or y >= self.__offset + self.height:
             self.event_queue.insert(Event('scroll', None))
         else:
-            self.__move(x, y)
+            if y - self.__offset < len(self.screen):
+                self.__move(x, y, self.screen[y - self.__offset])
+            else:
+                self.__move(x, y)
             self.__posxy = x, y
-            self.flushoutput()
+
+    def move_cursor(self, x, y):
+        self.__move_cursor(x, y)
+        self.flushoutput()
 
     def prepare(self):
         # per-readline preparations:
@@ -372,13 +588,19 @@ class UnixConsole(Console):
         self.height, self.width = self.getheightwidth()
 
         self.__buffer = []
+        # rendered terminfo codes; padding depends on the line speed and
+        # the height, so this is emptied whenever they might change
+        self.__codes = LRUCache(256)
 
         self.__posxy = 0, 0
         self.__gone_tall = 0
-        self.__move = self.__move_short
         self.__offset = 0
 
         self.__maybe_write_code(self._smkx)
+        if self.bracketed_paste:
+            self.__write_code(b'\033[?2004h')
+        if self.synchronized_output and self.__sync is None:
+            self.__sync = self.__query_mode(2026)
 
         try:
             self.old_sigwinch = signal.signal(
@@ -386,8 +608,42 @@ class UnixConsole(Console):
         except ValueError:
             pass
 
+    def __query_mode(self, mode):
+        """Ask the terminal about DEC private mode 'mode' with DECRQM
+        and return whether it supports it.  Anything else read while
+        waiting for the answer, typically typeahead, is kept as input."""
+        self.__write_code(('\033[?%d$p' % mode).encode('ascii'))
+        self.flushoutput()
+        reply = re.compile(
+            ('\033\\[\\?%d;([0-9])\\$y' % mode).encode('ascii'))
+        data = b''
+        deadline = time.time() + self.probe_timeout
+        while 1:
+            m = reply.search(data)
+            if m:
+                break
+            timeout = deadline - time.time()
+            if timeout <= 0 or not self.pollob.poll(int(timeout * 1000) + 1):
+                break
+            try:
+                chunk = os.read(self.input_fd, self.read_size)
+            except (IOError, OSError) as err:
+                if err.errno == errno.EINTR:
+                    continue
+                raise
+            if not chunk:
+                break
+            data += chunk
+        if m:
+            data = data[:m.start()] + data[m.end():]
+        self.event_queue.push_bytes(data)
+        # 0 is not recognized, 4 permanently reset
+        return m is not None and m.group(1) in (b'1', b'2', b'3')
+
     def restore(self):
         self.__maybe_write_code(self._rmkx)
+        if self.bracketed_paste:
+            self.__write_code(b'\033[?2004l')
         self.flushoutput()
         tcsetattr(self.input_fd, termios.TCSADRAIN, self.__svtermstate)
 
@@ -397,6 +653,7 @@ class UnixConsole(Console):
 
     def __sigwinch(self, signum, frame):
         self.height, self.width = self.getheightwidth()
+        self.__codes.clear()
         self.event_queue.insert(Event('resize', None))
 
     def push_char(self, char):
@@ -406,9 +663,12 @@ class UnixConsole(Console):
     def get_event(self, block=1):
         while self.event_queue.empty():
             while 1:
-                # All hail Unix!
+                # All hail Unix!  In raw mode read() returns as soon as
+                # there is any input, with as much of it as there is
+                # room for, so a paste costs a few reads, not one per
+                # byte.
                 try:
-                    self.push_char(os.read(self.input_fd, 1))
+                    data = os.read(self.input_fd, self.read_size)
                 except (IOError, OSError) as err:
                     if err.errno == errno.EINTR:
                         if not self.event_queue.empty():
@@ -418,6 +678,10 @@ class UnixConsole(Console):
                     else:
                         raise
                 else:
+                    if not data:
+                        raise EOFError
+                    trace('read {data!r}', data=data)
+                    self.event_queue.push_bytes(data)
                     break
             if not block:
                 break
@@ -426,6 +690,12 @@ class UnixConsole(Console):
     def wait(self):
         self.pollob.poll()
 
+    def get_window_height(self):
+        return self.height
+
+    def input_pending(self):
+        return not self.event_queue.empty() or bool(self.pollob.poll(0))
+
     def set_cursor_vis(self, vis):
         if vis:
             self.__show_cursor()
@@ -433,7 +703,7 @@ class UnixConsole(Console):
             self.__hide_cursor()
 
     def __hide_cursor(self):
-        if self.cursor_visible:
+        if self.cursor_visible and not self.__in_sync_frame:
             self.__maybe_write_code(self._civis)
             self.cursor_visible = 0
 
@@ -474,45 +744,86 @@ class UnixConsole(Console):
         termios.tcflush(self.input_fd, termios.TCIFLUSH)
 
     def flushoutput(self):
-        for text, iscode in self.__buffer:
+        # assemble the whole frame and hand it to the terminal in one
+        # go; one write per chunk costs a syscall (and over a network,
+        # a packet) for every cursor movement
+        out = bytearray()
+        text = []
+        for chunk, iscode in self.__buffer:
             if iscode:
-                self.__tputs(text)
+                if text:
+                    out += ''.join(text).encode(self.encoding, 'replace')
+                    del text[:]
+                for part in chunk:
+                    if isinstance(part, bytes):
+                        out += part
+                    else:
+                        # give the terminal time to act on what it has
+                        # been sent so far
+                        self.__write_out(out)
+                        out = bytearray()
+                        time.sleep(part)
             else:
-                os.write(self.output_fd, text.encode(self.encoding, 'replace'))
+                text.append(chunk)
+        if text:
+            out += ''.join(text).encode(self.encoding, 'replace')
         del self.__buffer[:]
+        self.__write_out(out)
+
+    def __write_out(self, data):
+        while data:
+            try:
+                n = os.write(self.output_fd, data)
+            except (IOError, OSError) as err:
+                if err.errno == errno.EINTR:
+                    continue
+                raise
+            self.frame_writes += 1
+            self.frame_bytes += n
+            data = data[n:]
 
     def __tputs(self, fmt, prog=delayprog):
         """A Python implementation of the curses tputs function; the
         curses one can't really be wrapped in a sane manner.
 
+        Returns a tuple of the bytes to output and, where the terminal
+        needs time that padding characters can't give it, the number of
+        seconds to sleep for.
+
         I have the strong suspicion that this is complexity that
         will never do anyone any good."""
         # using .get() means that things will blow up
         # only if the bps is actually needed (which I'm
         # betting is pretty unlkely)
         bps = ratedict.get(self.__svtermstate.ospeed)
+        parts = []
+        out = b''
         while 1:
             m = prog.search(fmt)
             if not m:
-                os.write(self.output_fd, fmt)
+                out += fmt
                 break
             x, y = m.span()
-            os.write(self.output_fd, fmt[:x])
+            out += fmt[:x]
             fmt = fmt[y:]
             delay = int(m.group(1))
-            if '*' in m.group(2):
+            if b'*' in m.group(2):
                 delay *= self.height
             if self._pad:
-                nchars = (bps*delay)/1000
-                os.write(self.output_fd, self._pad*nchars)
+                nchars = (bps*delay)//1000
+                out += self._pad*nchars
             else:
-                time.sleep(float(delay)/1000.0)
+                parts.append(out)
+                parts.append(float(delay)/1000.0)
+                out = b''
+        parts.append(out)
+        return tuple(parts)
 
     def finish(self):
         y = len(self.screen) - 1
         while y >= 0 and not self.screen[y]:
             y -= 1
-        self.__move(0, min(y, self.height + self.__offset - 1))
+        self.__move(0, self.__offset + y)
         self.__write("\n\r")
         self.flushoutput()
 
@@ -555,6 +866,5 @@ class UnixConsole(Console):
     def clear(self):
         self.__write_code(self._clear)
         self.__gone_tall = 1
-        self.__move = self.__move_tall
         self.__posxy = 0, 0
         self.screen = []
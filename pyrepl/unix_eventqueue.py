@@ -72,6 +72,12 @@ CTRL_ARROW_KEYCODE = {
     b'\033Oc': 'ctrl right',
 }
 
+# with bracketed paste mode on, terminals send pasted text between
+# these, so that it can be told apart from typing
+PASTE_START = b'\033[200~'
+PASTE_END = b'\033[201~'
+
+
 def general_keycodes():
     keycodes = {}
     for key, tiname in _keynames.items():
@@ -80,6 +86,7 @@ def general_keycodes():
         if keycode:
             keycodes[keycode] = key
     keycodes.update(CTRL_ARROW_KEYCODE)
+    keycodes[PASTE_START] = 'paste start'
     return keycodes
 
 
@@ -99,6 +106,7 @@ class EncodedQueue(object):
         self.events = deque()
         self.buf = bytearray()
         self.encoding = encoding
+        self.paste = None   # the text pasted so far, while in a paste
 
     def get(self):
         if self.events:
@@ -119,8 +127,13 @@ class EncodedQueue(object):
         self.events.append(event)
 
     def push(self, char):
-        ord_char = char if isinstance(char, int) else ord(char)
-        self.buf.append(ord_char)
+        if isinstance(char, int):
+            # what iterating over bytes gives on Python 3
+            char = bytes(bytearray((char,)))
+        if self.paste is not None:
+            self.push_paste(char)
+            return
+        self.buf.append(ord(char))
         if char in self.k:
             if self.k is self.ck:
                 #sanity check, buffer is empty when a special key comes
@@ -129,6 +142,10 @@ class EncodedQueue(object):
             trace('found map {k!r}', k=k)
             if isinstance(k, dict):
                 self.k = k
+            elif k == 'paste start':
+                self.flush_buf()
+                self.k = self.ck
+                self.paste = bytearray()
             else:
                 self.insert(Event('key', k, self.flush_buf()))
                 self.k = self.ck
@@ -139,9 +156,9 @@ class EncodedQueue(object):
             # the docstring in keymap.py, in particular the line \\E.
             trace('unrecognized escape sequence, propagating...')
             self.k = self.ck
-            self.insert(Event('key', '\033', '\033'))
-            for c in self.flush_buf()[1:]:
-                self.push(chr(c))
+            self.insert(Event('key', '\033', b'\033'))
+            for c in bytearray(self.flush_buf()[1:]):
+                self.push(c)
 
         else:
             try:
@@ -151,3 +168,30 @@ class EncodedQueue(object):
             else:
                 self.insert(Event('key', decoded, self.flush_buf()))
             self.k = self.ck
+
+    def push_bytes(self, data):
+        """Push each byte of data in turn."""
+        push = self.push
+        i = 0
+        while i < len(data):
+            if self.paste is not None:
+                # no need to go byte by byte through a paste
+                i += self.push_paste(data[i:])
+            else:
+                push(data[i:i + 1])
+                i += 1
+
+    def push_paste(self, data):
+        """Add data to the paste in progress.  When it contains the end
+        of the paste, queue a 'paste' event with the pasted text and
+        return how much of data was part of the paste."""
+        paste = self.paste
+        start = max(0, len(paste) - len(PASTE_END) + 1)
+        paste += data
+        end = paste.find(PASTE_END, start)
+        if end == -1:
+            return len(data)
+        self.paste = None
+        raw = bytes(paste[:end])
+        self.insert(Event('paste', raw.decode(self.encoding, 'replace'), raw))
+        return len(data) - (len(paste) - end - len(PASTE_END))
@@ -0,0 +1,51 @@
+from pyrepl.completer import Completer
+
+
+def test_global_matches():
+    ns = {'print_all': 1, 'prefix': 2, '__builtins__': 3}
+    c = Completer(ns)
+    # print is a builtin, and a keyword in Python 2
+    assert c.complete('pr') == ['prefix', 'print', 'print_all', 'property']
+    assert c.complete('__builtins') == []
+    assert c.complete('zzz') == []
+    ns['print_more'] = 4
+    assert c.complete('print_') == ['print_all', 'print_more']
+    del ns['prefix']
+    assert c.complete('pre') == []
+    ns[1] = 'not a name'
+    assert c.complete('print_m') == ['print_more']
+    c.ns = {'print_other': 5}
+    assert c.complete('print_') == ['print_other']
+
+
+def test_same_size_rename():
+    ns = {'spam_alpha': 1, 'spam_beta': 2}
+    c = Completer(ns)
+    assert c.complete('spam_al') == ['spam_alpha']
+    del ns['spam_alpha']
+    ns['spam_alps'] = 1
+    assert c.complete('spam_alp') == ['spam_alps']
+    del ns['spam_beta']
+    ns['spam_bets'] = 2
+    ns['spam_beta'] = 3
+    del ns['spam_bets']
+    # same size and same last name as when the index was built
+    assert c.complete('spam_bet') == ['spam_beta']
+    del ns['spam_alps']
+    ns['spam_gamma'] = 1
+    assert c.complete('spam_al') == []
+    assert c.complete('spam_gam') == ['spam_gamma']
+
+
+def test_attr_matches():
+    class A(object):
+        spam = 1
+
+    class B(A):
+        def spam_eggs(self):
+            pass
+
+    c = Completer({'b': B()})
+    assert c.complete('b.sp') == ['b.spam', 'b.spam_eggs']
+    matches = c.complete('b.__')
+    assert matches == sorted(set(matches)) and 'b.__class__' in matches
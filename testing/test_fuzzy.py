@@ -0,0 +1,106 @@
+import random
+
+from pyrepl.fuzzy import FuzzyFinder
+from pyrepl.historical_reader import HistoricalReader
+from .infrastructure import TestReader, read_spec
+
+
+class HistoricalTestReader(HistoricalReader, TestReader):
+    pass
+
+
+def slow_best(finder, query, n):
+    scored = []
+    for rank, text in enumerate(finder.texts):
+        # the leftmost match, each character as early as possible
+        start = end = text.find(query[0])
+        gaps = 0
+        for c in query:
+            p = text.find(c, end)
+            if p == -1:
+                break
+            gaps += p - end
+            end = p + 1
+        else:
+            score = finder.keys[rank] - finder.penalty(gaps, start)
+            scored.append((-score, rank))
+    scored.sort()
+    return [rank for score, rank in scored[:n]]
+
+
+def test_best_matches_everything_ranked():
+    rand = random.Random(42)
+    history = [''.join(rand.choice('abcd (') for _ in range(rand.randrange(8)))
+               for _ in range(3000)]
+    class Finder(FuzzyFinder):
+        half_life = 20
+
+    finder = Finder(history)
+    assert sorted(finder.entries) == sorted(set(history))
+    assert finder.keys == sorted(finder.keys, reverse=True)
+    for n in range(20):
+        query = ''.join(rand.choice('abcd (') for _ in range(4))
+        while finder.query:
+            finder.back()
+        for c in query:
+            finder.add(c)
+            assert finder.best(5) == slow_best(finder, finder.query, 5)
+        finder.back()
+        assert finder.best(20) == slow_best(finder, finder.query, 20)
+
+
+def test_frecency():
+    finder = FuzzyFinder(['print(x)', 'pass', 'pass', 'pprint(y)'])
+    # used twice beats used once, a little more recently
+    assert finder.entries == ['pass', 'pprint(y)', 'print(x)']
+    finder.add('p')
+    finder.add('r')
+    # a close match beats a better ranked one
+    assert [finder.entries[i] for i in finder.best(3)] == [
+        'print(x)', 'pprint(y)']
+
+
+def test_fuzzy_history_search():
+    class Reader(HistoricalTestReader):
+        def __init__(self, console):
+            HistoricalTestReader.__init__(self, console)
+            self.history = ['import os', 'print(x)', 'pass', 'x = 1']
+
+    read_spec([
+        (('self-insert', 'y'),      ['y']),
+        ('fuzzy-history-search',    ["(fuzzy `') x = 1", '> x = 1',
+                                     '  pass', '  print(x)',
+                                     '  import os']),
+        (('key', 'p'),              ["(fuzzy `p') pass", '> pass',
+                                     '  print(x)', '  import os']),
+        (('key', 's'),              ["(fuzzy `ps') pass", '> pass',
+                                     '  import os']),
+        ('fuzzy-backspace',         ["(fuzzy `p') pass", '> pass',
+                                     '  print(x)', '  import os']),
+        ('fuzzy-next',              ["(fuzzy `p') print(x)", '  pass',
+                                     '> print(x)', '  import os']),
+        (('key', '\x07'),           ['y']),
+        ('fuzzy-history-search',    ["(fuzzy `') x = 1", '> x = 1',
+                                     '  pass', '  print(x)',
+                                     '  import os']),
+        (('key', 'o'),              ["(fuzzy `o') import os",
+                                     '> import os']),
+        (('key', '\r'),             ['import os']),
+        ('accept',                  ['import os'])], Reader)
+
+
+def test_paste_in_fuzzy_history_search():
+    class Reader(HistoricalTestReader):
+        def __init__(self, console):
+            HistoricalTestReader.__init__(self, console)
+            self.history = ['import os', 'print(x)', 'pass']
+
+    read_spec([
+        ('fuzzy-history-search',    ["(fuzzy `') pass", '> pass',
+                                     '  print(x)', '  import os']),
+        (('paste', 'pt'),           ["(fuzzy `pt') import os",
+                                     '> import os', '  print(x)']),
+        (('paste', '('),            ["(fuzzy `pt(') print(x)",
+                                     '> print(x)']),
+        (('key', '\r'),             ['print(x)']),
+        ('accept',                  ['print(x)'])], Reader)
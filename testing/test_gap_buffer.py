@@ -0,0 +1,95 @@
+import random
+
+from pyrepl.gap_buffer import GapBuffer
+from .infrastructure import read_spec
+
+
+def test_list_operations():
+    b = GapBuffer('hello')
+    b[5:5] = ' world'
+    assert b.get_text() == 'hello world'
+    assert b[0] == 'h'
+    assert b[-1] == 'd'
+    assert b[3:8] == list('lo wo')
+    del b[0:6]
+    assert b == list('world')
+    b.insert(0, 'W')
+    del b[1]
+    assert b.get_text() == 'World'
+    assert b.index('l') == 3
+    b[2:2] = '\n'
+    assert '\n' in b and b.index('\n') == 2
+    assert b.line_start(4) == 3 and b.line_end(0) == 2
+    del b[2]
+    assert b.count('o') == 1
+    assert 'r' in b and 'x' not in b
+    del b[:]
+    assert len(b) == 0 and b.get_text() == ''
+
+
+def test_matches_list():
+    rng = random.Random(42)
+    b = GapBuffer()
+    l = []
+    for i in range(2000):
+        p = rng.randint(0, len(l))
+        op = rng.random()
+        if op < 0.6:
+            text = rng.choice(['a', 'bc', '\n', 'xyz'])
+            b[p:p] = text
+            l[p:p] = text
+        elif l:
+            q = min(len(l), p + rng.randint(0, 3))
+            del b[p:q]
+            del l[p:q]
+        assert len(b) == len(l)
+        lo = rng.randint(0, len(l))
+        hi = rng.randint(lo, len(l))
+        assert b[lo:hi] == l[lo:hi]
+        text = ''.join(l)
+        assert b.count('\n') == text.count('\n')
+        assert b.line_start(lo) == text.rfind('\n', 0, lo) + 1
+        end = text.find('\n', lo)
+        assert b.line_end(lo) == (len(l) if end == -1 else end)
+        assert b.line_number(lo) == text.count('\n', 0, lo)
+    assert list(b) == l
+    assert b.get_text() == ''.join(l)
+
+
+def test_changed_lines():
+    rng = random.Random(42)
+    b = GapBuffer('ab\ncd\nef')
+    assert b.changed_lines() is None
+    b[4:4] = 'x'
+    b[3:3] = '\n'
+    assert b.changed_lines() == (1, 2, 3)
+    assert b.changed_lines() is None
+    for i in range(500):
+        before = b.get_text().split('\n')
+        for j in range(rng.randint(1, 3)):
+            p = rng.randint(0, len(b))
+            q = min(len(b), p + rng.randint(0, 3))
+            op = rng.random()
+            if op < 0.4:
+                b[p:q] = rng.choice(['a', 'b\nc', '\n', ''])
+            elif op < 0.7 and q > p:
+                del b[p:q]
+            elif op < 0.9 and q > p:
+                b[p] = rng.choice('a\n')
+            elif q > p:
+                del b[p]
+        after = b.get_text().split('\n')
+        changed = b.changed_lines()
+        if changed is None:
+            assert after == before
+            continue
+        start, end, new_end = changed
+        assert before[:start] == after[:start]
+        assert before[end:] == after[new_end:]
+
+
+def test_reader_editing():
+    read_spec([(('self-insert', 'abc'), ['abc']),
+               ('left',                 ['abc']),
+               (('self-insert', 'd'),   ['abdc']),
+               ('accept',               ['abdc'])])
@@ -0,0 +1,469 @@
+import random
+
+import pytest
+
+from pyrepl.historical_reader import HistoricalReader
+from pyrepl.history import History, HistoryFile, LazyHistory, PrefixIndex
+from .infrastructure import TestConsole, TestReader, read_spec
+
+
+class HistoricalTestReader(HistoricalReader, TestReader):
+    pass
+
+
+def slow_find_item(items, term, i, forwards):
+    if forwards:
+        indices = range(max(i + 1, 0), len(items))
+    else:
+        indices = range(min(i, len(items)) - 1, -1, -1)
+    for j in indices:
+        if term in items[j]:
+            return j
+    return None
+
+
+def test_find_item():
+    h = History(['abc', 'bcd', '', 'xab', 'a\x00b'])
+    assert h.find_item('b', -1) == 0
+    assert h.find_item('b', 0) == 1
+    assert h.find_item('ab', 1) == 3
+    assert h.find_item('ab', 3, False) == 0
+    assert h.find_item('cx', 0) is None
+    assert h.find_item('', 1) == 2
+    assert h.find_item('', 3, False) == 2
+    assert h.find_item('\x00', 0) == 4
+
+
+def test_find_item_after_changes():
+    rand = random.Random(42)
+    h = History()
+    h.BLOCK = 4
+    items = []
+    for n in range(300):
+        op = rand.randrange(6)
+        word = ''.join(rand.choice('abc') for _ in range(rand.randrange(4)))
+        if op < 3 or not items:
+            h.append(word)
+            items.append(word)
+        elif op == 3:
+            i = rand.randrange(len(items))
+            h[i] = items[i] = word
+        elif op == 4:
+            i = rand.randrange(len(items))
+            del h[i:i + 2]
+            del items[i:i + 2]
+        else:
+            h.insert(0, word)
+            items.insert(0, word)
+        assert h == items
+        term = rand.choice(['a', 'ab', 'ca', 'bb', 'cab'])
+        i = rand.randrange(-1, len(items) + 1)
+        for forwards in (True, False):
+            assert (h.find_item(term, i, forwards) ==
+                    slow_find_item(items, term, i, forwards))
+
+
+def test_history_is_converted():
+    reader = HistoricalTestReader(None)
+    reader.history = ['a', 'b']
+    assert isinstance(reader.history, History)
+    shared = History()
+    reader.history = shared
+    assert reader.history is shared
+
+
+def test_isearch_sees_edits():
+    class Reader(HistoricalTestReader):
+        def __init__(self, console):
+            HistoricalTestReader.__init__(self, console)
+            self.history = ['fooX', 'bar', 'baz']
+    read_spec([
+        ('previous-history',        ['baz']),
+        ('previous-history',        ['bar']),
+        (('self-insert', 'X'),      ['barX']),
+        ('next-history',            ['baz']),
+        ('reverse-history-isearch', ["(r-search `') baz"]),
+        (('key', 'X'),              ["(r-search `X') barX"]),
+        (('key', '\x12'),           ["(r-search `X') fooX"]),
+        ('isearch-end',             ['fooX']),
+        ('accept',                  ['fooX'])], Reader)
+
+
+def test_paste_in_isearch():
+    class Reader(HistoricalTestReader):
+        def __init__(self, console):
+            HistoricalTestReader.__init__(self, console)
+            self.history = ['import os', 'print(x)', 'pass']
+    read_spec([
+        ('reverse-history-isearch', ["(r-search `') "]),
+        (('paste', 'pri'),          ["(r-search `pri') print(x)"]),
+        (('key', 'n'),              ["(r-search `prin') print(x)"]),
+        (('paste', 'x'),            ["(r-search `prinx') print(x)",
+                                     '! not found ']),
+        ('isearch-end',             ['print(x)']),
+        (('paste', '!'),            ['!print(x)']),
+        ('accept',                  ['!print(x)'])], Reader)
+
+
+def test_sqlite_find_prefix_uses_the_index(tmp_path):
+    sqlite_history = pytest.importorskip('pyrepl.sqlite_history')
+    h = sqlite_history.SQLiteHistory(':memory:')
+    h.scan_window = 16
+    with h.db:
+        h.db.executemany("INSERT INTO entries (pos, line) VALUES (?, ?)",
+                         [(i, 'print(%d)' % i) for i in range(20000)])
+    h._len = 20000
+    steps = []
+    h.db.set_progress_handler(lambda: steps.append(1), 100)
+    assert h.find_prefix('import', len(h)) is None
+    assert h.find_prefix('print(7', 100) == 79
+    # far fewer than scanning the table would take
+    assert len(steps) < 100
+
+
+def test_sqlite_history_closed_at_exit(tmp_path, monkeypatch):
+    pytest.importorskip('pyrepl.sqlite_history')
+    from pyrepl import python_reader
+    registered = []
+    monkeypatch.setattr(python_reader.atexit, 'register', registered.append)
+
+    class Reader(python_reader.PythonicReader):
+        history_db = str(tmp_path / 'history.db')
+
+    reader = Reader(TestConsole([]), {})
+    assert registered == [reader.history.close]
+
+
+def test_sqlite_history(tmp_path):
+    sqlite_history = pytest.importorskip('pyrepl.sqlite_history')
+    filename = str(tmp_path / 'history.db')
+    h = sqlite_history.SQLiteHistory(filename)
+    h.page_size = 4
+    rand = random.Random(42)
+    items = []
+    for n in range(200):
+        op = rand.randrange(5)
+        word = ''.join(rand.choice('abc"') for _ in range(rand.randrange(6)))
+        if op < 3 or not items:
+            h.append(word)
+            items.append(word)
+        elif op == 3:
+            i = rand.randrange(len(items))
+            h[i] = items[i] = word
+        else:
+            i = rand.randrange(len(items))
+            del h[i:i + 2]
+            del items[i:i + 2]
+        assert len(h) == len(items)
+        i = rand.randrange(len(items))
+        assert h[i] == items[i] and h[-1] == items[-1]
+        term = rand.choice(['a', 'ab', 'ca"', 'bba', 'cab'])
+        i = rand.randrange(-1, len(items) + 1)
+        for forwards in (True, False):
+            assert (h.find_item(term, i, forwards) ==
+                    slow_find_item(items, term, i, forwards))
+    assert list(h) == items and h[2:5] == items[2:5]
+    h.close()
+    h = sqlite_history.SQLiteHistory(filename)
+    assert list(h) == items
+    del h[:]
+    h.append('import os')
+    h.append('print(1)')
+    h.append('import sys')
+    assert h.find_prefix('import', 3) == 2
+    assert h.find_prefix('import', 2) == 0
+    assert h.find_prefix('import', 0, forwards=True) == 2
+    assert h.find_prefix('x', 3) is None
+    reader = HistoricalTestReader(None)
+    reader.history = h
+    assert reader.history is h
+
+
+def test_history_file_sessions(tmp_path):
+    filename = str(tmp_path / 'history')
+    with open(filename, 'wb') as f:
+        # as the whole-file savers write it
+        f.write(b'one\ntwo')
+    a = HistoryFile(filename)
+    b = HistoryFile(filename)
+    assert a.load() == ['one', 'two'] and b.load() == ['one', 'two']
+    assert a.append('three') == []
+    assert b.read_new() == ['three']
+    assert b.append('four') == []
+    assert a.append('five') == ['four']
+    assert b.read_new() == ['five'] and b.read_new() == []
+    with open(filename, 'rb') as f:
+        assert f.read() == b'one\ntwo\nthree\nfour\nfive\n'
+
+
+def test_history_file_compaction(tmp_path):
+    filename = str(tmp_path / 'history')
+    a = HistoryFile(filename, max_length=3)
+    b = HistoryFile(filename)
+    # the file doesn't exist yet, so everything in it will be new
+    assert a.load() == [] and b.load() == []
+    assert a.append('x') == []
+    assert b.read_new() == ['x']
+    for entry in ['y', 'x']:
+        assert a.append(entry) == []
+    # max_length + 1 records have been appended
+    assert a.append('z') is None
+    assert a.load() == ['y', 'x', 'z']
+    assert b.read_new() is None
+    assert b.load() == ['y', 'x', 'z']
+    assert b.append('w') == []
+    assert a.read_new() == ['w']
+
+
+def test_history_file_reader(tmp_path):
+    filename = str(tmp_path / 'history')
+    other = HistoryFile(filename)
+    other.load()
+
+    class Reader(HistoricalTestReader):
+        def __init__(self, console):
+            HistoricalTestReader.__init__(self, console)
+            self.history_file = HistoryFile(filename)
+            self.history = self.history_file.load()
+            other.append('from another session')
+
+    read_spec([
+        ('previous-history',  ['from another session']),
+        ('next-history',      ['']),
+        (('self-insert', 'a'), ['a']),
+        ('accept',            ['a'])], Reader)
+    with open(filename, 'rb') as f:
+        assert f.read() == b'from another session\na\n'
+
+
+def test_history_file_format(tmp_path):
+    filename = str(tmp_path / 'history')
+    f = HistoryFile(filename)
+    entries = [u'if x:\n    pass', u'a\\nb\\', u'\u20ac']
+    for entry in entries:
+        f.append(entry)
+    assert f.load() == entries
+    with open(filename, 'rb') as f:
+        assert f.read().count(b'\n') == 3
+
+
+def test_readline_history_file(tmp_path):
+    from pyrepl.readline import ReadlineHistoryFile
+    filename = str(tmp_path / 'history')
+    f = ReadlineHistoryFile(filename)
+    f.append(u'if x:\n    pass')
+    f.append(u'\u20ac')
+    assert f.load() == [u'if x:\n    pass', u'\u20ac']
+
+
+def test_duplicates_policies():
+    class Consecutive(History):
+        duplicates = 'consecutive'
+
+    class Erase(History):
+        duplicates = 'erase'
+
+    h = Consecutive(['a', 'a', 'b', 'a'])
+    assert h == ['a', 'b', 'a']
+    assert h.append('a') == [] and h == ['a', 'b', 'a']
+    h = Erase(['a', 'b', 'a', 'c'])
+    assert h == ['b', 'a', 'c']
+    assert h.append('b') == [0] and h == ['a', 'c', 'b']
+    assert h.append('d') == [] and h.find_item('a', 3, False) == 0
+    del h[0]
+    assert h.append('a') == [] and h == ['c', 'b', 'd', 'a']
+    # copies of an entry are one string
+    line = ''.join(['print', '(x)'])
+    h = History(['print(x)', line])
+    assert h[0] is h[1]
+
+
+def test_size_limits():
+    class Limited(History):
+        duplicates = 'erase'
+        max_length = 3
+        max_chars = 10
+
+    h = Limited(['a', 'bb', 'ccc', 'dddd'])
+    assert h == ['bb', 'ccc', 'dddd']
+    assert h.append('ccc') == [1] and h == ['bb', 'dddd', 'ccc']
+    assert h.append('eeeee') == [0, 1] and h == ['ccc', 'eeeee']
+    # erasing the older copy makes room
+    assert h.append('ccc') == [0] and h == ['eeeee', 'ccc']
+    # the newest entry is kept, however long
+    assert h.append('f' * 20) == [0, 1] and h == ['f' * 20]
+
+
+def test_operate_and_get_next_with_erase():
+    class Erase(History):
+        duplicates = 'erase'
+
+    class Reader(HistoricalTestReader):
+        history_class = Erase
+
+        def __init__(self, console):
+            HistoricalTestReader.__init__(self, console)
+            self.history = ['a', 'b', 'c']
+
+    reader = Reader(TestConsole([('previous-history', None),
+                                 ('previous-history', None),
+                                 ('operate-and-get-next', None),
+                                 ('accept', None)]))
+    assert reader.readline(returns_unicode=True) == 'b'
+    assert reader.history == ['a', 'c', 'b']
+    # the line after the one accepted
+    assert reader.readline(returns_unicode=True) == 'c'
+
+
+def test_lazy_history():
+    class Lazy(LazyHistory):
+        eager = 3
+        chunk = 4
+
+    entries = ['line %d' % i for i in range(20)]
+    data = '\n'.join(entries).encode('ascii')
+    decode = lambda record: record.decode('ascii')
+    for sep_at_end in [b'', b'\n']:
+        h = Lazy(data + sep_at_end, decode)
+        assert len(h) == 20 and h._pending == 17
+        assert h[-1] == 'line 19' and h[16] == 'line 16'
+        assert h._pending == 13
+        assert h[5] == 'line 5' and h._pending == 5
+        assert h[0] == 'line 0' and h._pending == 0
+    h = Lazy(data, decode)
+    h.append('line 20')
+    assert len(h) == 21 and h[-1] == 'line 20' and h._pending == 17
+    assert h.find_item('line 1', 20, False) == 19
+    assert h == entries + ['line 20']
+    assert Lazy(b'', decode) == [] and len(Lazy(b'\n', decode)) == 1
+
+    class Erase(Lazy):
+        duplicates = 'erase'
+
+    h = Erase(b'a\nb\na\nc', decode)
+    assert h == ['b', 'a', 'c'] and h.append('b') == [0]
+
+
+def slow_find_prefix(items, prefix, i, forwards):
+    if forwards:
+        indices = range(max(i + 1, 0), len(items))
+    else:
+        indices = range(min(i, len(items)) - 1, -1, -1)
+    for j in indices:
+        if items[j].startswith(prefix):
+            return j
+    return None
+
+
+def test_find_prefix_after_changes(monkeypatch):
+    def append(items, word, erase):
+        if erase:
+            if items and items[-1] == word:
+                return
+            if word in items:
+                items.remove(word)
+        items.append(word)
+        if erase:
+            del items[:-40]
+
+    monkeypatch.setattr(PrefixIndex, 'LOAD', 2)
+
+    class Limited(History):
+        duplicates = 'erase'
+        max_length = 40
+
+    rand = random.Random(42)
+    for h in [History(), Limited()]:
+        items = []
+        for n in range(400):
+            op = rand.randrange(6)
+            word = ''.join(rand.choice('abc')
+                           for _ in range(rand.randrange(5)))
+            if op < 3 or not items:
+                h.append(word)
+                append(items, word, h.duplicates)
+            elif op == 3:
+                if h.duplicates and word in items:
+                    continue
+                i = rand.randrange(len(items))
+                h[i] = items[i] = word
+            elif op == 4:
+                i = rand.randrange(len(items))
+                del h[i]
+                del items[i]
+            else:
+                h.extend([word, word[::-1]])
+                append(items, word, h.duplicates)
+                append(items, word[::-1], h.duplicates)
+            assert h == items
+            prefix = rand.choice(['', 'a', 'ab', 'ca', 'bbc'])
+            assert (h.find_prefix(prefix, len(items)) ==
+                    slow_find_prefix(items, prefix, len(items), False))
+            i = rand.randrange(-1, len(items) + 1)
+            for forwards in (True, False):
+                assert (h.find_prefix(prefix, i, forwards) ==
+                        slow_find_prefix(items, prefix, i, forwards))
+
+
+def test_autosuggest():
+    class Reader(HistoricalTestReader):
+        autosuggest = True
+
+        def __init__(self, console):
+            HistoricalTestReader.__init__(self, console)
+            self.history = ['print(1)', 'import os', 'print(22)', 'pass']
+
+    dim = '\x1b[2m%s\x1b[0m'
+    read_spec([
+        (('self-insert', 'p'),  ['p' + dim % 'ass']),
+        (('self-insert', 'r'),  ['pr' + dim % 'int(22)']),
+        ('left',                ['pr']),
+        ('accept-suggestion',   ['pr' + dim % 'int(22)']),
+        (('self-insert', 'x'),  ['prx']),
+        ('backspace',           ['pr' + dim % 'int(22)']),
+        ('accept-suggestion',   ['print(22)']),
+        ('accept',              ['print(22)'])], Reader)
+
+
+def test_autosuggest_on_a_tall_screen():
+    class WindowConsole(TestConsole):
+        def get_window_height(self):
+            return 3
+
+    reader = HistoricalTestReader(WindowConsole([]))
+    reader.autosuggest = True
+    reader.layout_margin = 0
+    reader.history = ['\n' * 20 + 'pass']
+    reader.prepare()
+    reader.insert('\n' * 20 + 'p')
+    screen = reader.calc_screen()
+    assert reader.screen_top == 17
+    assert screen[-1] == 'p\x1b[2mass\x1b[0m'
+
+
+def test_prefix_index_built_before_typing(monkeypatch):
+    import pyrepl.history
+    built = []
+
+    class CountingIndex(PrefixIndex):
+        def __init__(self, items):
+            built.append(1)
+            PrefixIndex.__init__(self, items)
+
+    monkeypatch.setattr(pyrepl.history, 'PrefixIndex', CountingIndex)
+    reader = HistoricalTestReader(TestConsole([]))
+    reader.autosuggest = True
+    # the empty history is indexed, then the one loaded
+    reader.prepare()
+    reader.history = ['print(%d)' % i for i in range(100)]
+    assert len(built) == 2
+    for c in 'print(4':
+        reader.insert(c)
+        reader.calc_screen()
+    assert reader.get_suggestion() == '9)'
+    # accepting the line adds it to the index
+    reader.finish()
+    reader.prepare()
+    reader.insert('print(')
+    assert reader.get_suggestion() == '4'
+    assert len(built) == 2
@@ -0,0 +1,303 @@
+import random
+
+import pytest
+
+from pyrepl.reader import Reader, disp_str
+from pyrepl.unicode_width import WIDE_PAD
+from .infrastructure import TestConsole, TestReader, read_spec
+
+
+def make_reader(text, width=10):
+    con = TestConsole([])
+    con.width = width
+    reader = TestReader(con)
+    reader.prepare()
+    reader.insert(text)
+    return reader
+
+
+def test_wrapped_lines():
+    reader = make_reader('a' * 20)
+    assert reader.calc_screen() == ['a' * 9 + '\\', 'a' * 9 + '\\', 'aa']
+    assert reader.cxy == (2, 2)
+
+
+def test_layout_cache():
+    reader = make_reader('abc\ndef\nghi')
+    screen = reader.calc_screen()
+    assert screen == ['abc', 'def', 'ghi']
+    first = reader.screeninfo[0]
+    reader.pos = len(reader.buffer)
+    reader.insert('j')
+    assert reader.calc_screen() == ['abc', 'def', 'ghij']
+    # unchanged lines are not laid out again
+    assert reader.screeninfo[0] is first
+
+
+class PromptingReader(TestReader):
+    get_prompt = Reader.get_prompt
+
+
+class CountingReader(PromptingReader):
+    laid_out = 0
+
+    def _layout_line(self, prompt, line, w):
+        self.laid_out += 1
+        return TestReader._layout_line(self, prompt, line, w)
+
+
+def test_only_changed_lines_laid_out():
+    con = TestConsole([])
+    con.width = 20
+    reader = CountingReader(con)
+    reader.ps1 = reader.ps2 = reader.ps3 = reader.ps4 = ''
+    reader.prepare()
+    reader.insert('\n'.join(['line %d' % i for i in range(50)]))
+    reader.calc_screen()
+    assert reader.laid_out == 50
+    reader.pos = reader.buffer.newline_pos(20)
+    reader.insert('!')
+    reader.laid_out = 0
+    screen = reader.calc_screen()
+    assert screen[20] == 'line 20!'
+    assert reader.laid_out == 1
+    # a new line, and the one it was split from
+    reader.pos = len(reader.buffer)
+    reader.insert('\nx')
+    reader.laid_out = 0
+    reader.calc_screen()
+    assert reader.laid_out == 2
+    # the last line's prompt changes when another comes after it
+    reader.ps4 = '>'
+    reader.prepare()
+    reader.insert('a\nb')
+    reader.calc_screen()
+    reader.insert('\nc')
+    reader.laid_out = 0
+    assert reader.calc_screen() == ['a', 'b', '>c']
+    assert reader.laid_out == 2
+    # and the cursor's when there is an argument
+    reader.arg = 4
+    reader.laid_out = 0
+    assert reader.calc_screen()[-1] == '(arg: 4) c'
+    assert reader.laid_out == 1
+
+
+@pytest.mark.parametrize('windowed', [False, True])
+def test_incremental_layout(windowed):
+    rng = random.Random(42)
+    prompts = '>', 'a\n>', '', '>>'
+
+    def make(text, console_class):
+        con = console_class([])
+        con.width = 8
+        reader = PromptingReader(con)
+        reader.layout_margin = 1
+        reader.ps1, reader.ps2, reader.ps3, reader.ps4 = prompts
+        reader.prepare()
+        reader.insert(text)
+        return reader
+
+    reader = make('', WindowConsole if windowed else TestConsole)
+    for i in range(300):
+        n = len(reader.buffer)
+        op = rng.random()
+        if op < 0.5:
+            reader.insert(rng.choice(['ab', 'c\n', '\n', u'\u4e2d', 'abcdefghi']))
+        elif op < 0.7:
+            p = rng.randint(0, n)
+            del reader.buffer[p:p + rng.randint(0, 12)]
+            reader.pos = min(reader.pos, len(reader.buffer))
+        elif op < 0.9:
+            reader.pos = rng.randint(0, n)
+        else:
+            reader.arg = rng.choice([None, 2])
+        screen = reader.calc_screen()
+        # everything laid out afresh
+        fresh = make(reader.get_unicode(), TestConsole)
+        fresh.pos, fresh.arg = reader.pos, reader.arg
+        expected = fresh.calc_screen()
+        assert reader.cxy == fresh.cxy
+        y = reader.cxy[1]
+        if windowed:
+            # what can be displayed is the same
+            top = max(y - WindowConsole.height, 0)
+            bottom = min(y + WindowConsole.height, len(expected))
+            assert reader.screen_rows == len(expected)
+            assert reader.screen_top <= top
+            assert reader.screen_top + len(screen) >= bottom
+            first = reader.screen_top
+            assert screen[top - first:bottom - first] == expected[top:bottom]
+        else:
+            assert screen == expected
+        for p in range(len(reader.buffer) + 1):
+            assert reader.pos2xy(p) == fresh.pos2xy(p)
+
+
+def test_pos2xy_xy2pos():
+    reader = make_reader('ab\x03cdefghijkl\n\nxyz')
+    reader.calc_screen()
+    seen = set()
+    for pos in range(len(reader.buffer) + 1):
+        x, y = reader.pos2xy(pos)
+        assert (x, y) not in seen
+        seen.add((x, y))
+        assert reader.xy2pos(x, y) == pos
+    # all the columns used to display the \x03 map back to it
+    x, y = reader.pos2xy(2)
+    assert reader.pos2xy(3)[0] > x + 1
+    assert reader.xy2pos(x + 1, y) == 2
+    last = len(reader.screeninfo) - 1
+    assert reader.xy2pos(50, last) == len(reader.buffer)
+
+
+def test_disp_str():
+    assert disp_str('abc') == ('abc', [1, 1, 1])
+    assert disp_str('a\x03\t') == ('a^C    ', [1, 1, 0, 1, 0, 0, 0])
+    assert disp_str('\x7f\x85') == ('^?\\205', [1, 0, 1, 0, 0, 0])
+    # memoized results are shared
+    assert disp_str('x\x01') is disp_str('x\x01')
+    # but not mixed up with those of other join or uc functions
+    upper = lambda c: c.upper()
+    assert disp_str('ab', uc=upper) == ('AB', [1, 1])
+    assert disp_str('ab') == ('ab', [1, 1])
+
+
+def test_disp_str_wide_and_combining():
+    pad = WIDE_PAD
+    assert disp_str(u'a\u4e2db') == (u'a\u4e2d' + pad + u'b', [1, 1, 0, 1])
+    # combining marks are composed with the character before them
+    assert disp_str(u'e\u0301x') == (u'\xe9x', [2, 1])
+    # and follow it in its column when that is not possible
+    assert disp_str(u'x\u0331') == (u'x\u0331', [2])
+    assert disp_str(u'e\u0301\u0302') == (u'\xe9\u0302', [3])
+    assert disp_str(u'\u05e9\u05b8\u05c1') == (u'\u05e9\u05b8\u05c1', [3])
+    assert disp_str(u'\u0915\u094d\u0937') == (u'\u0915\u094d\u0937', [2, 1])
+    # joiners too, and a mark on a double-width character comes before
+    # the padding
+    man, woman = u'\U0001f468', u'\U0001f469'
+    assert disp_str(man + u'\u200d' + woman) == (
+        man + u'\u200d' + pad + woman + pad, [2, 0, 1, 0])
+    # with nothing to go with, they are escaped
+    assert disp_str(u'\u0301x') == (u'\\x0301x', [1, 0, 0, 0, 0, 0, 1])
+    assert disp_str(u'\x03\u0301') == (u'^C\\x0301', [1, 0, 1, 0, 0, 0, 0, 0])
+
+
+def test_combining_marks_wrap():
+    reader = make_reader(u'abcde\u0331fghijk')
+    screen = reader.calc_screen()
+    assert screen == [u'abcde\u0331fghi\\', u'jk']
+    assert reader.cxy == (2, 1)
+    assert reader.pos2xy(4) == (4, 0)
+    assert reader.pos2xy(6) == (5, 0)
+    assert reader.xy2pos(5, 0) == 6
+    # a position between a character and its marks is shown on it
+    reader = make_reader(u'abcdefgh\u4e2d\u0331\u0331')
+    reader.calc_screen()
+    assert reader.pos2xy(9) == (0, 1)
+    assert reader.pos2xy(11) == (2, 1)
+
+
+def test_wide_chars_wrap():
+    reader = make_reader(u'abcdefgh\u4e2d\u6587')
+    screen = reader.calc_screen()
+    # the first ideograph doesn't fit on the first row, so moves down
+    assert screen == [u'abcdefgh\\', u'\u4e2d' + WIDE_PAD + u'\u6587' + WIDE_PAD]
+    assert reader.cxy == (4, 1)
+    assert reader.pos2xy(8) == (0, 1)
+    assert reader.pos2xy(9) == (2, 1)
+    assert reader.xy2pos(1, 1) == 8
+    assert reader.xy2pos(3, 1) == 9
+
+
+class TypeaheadConsole(TestConsole):
+    def __init__(self, events):
+        TestConsole.__init__(self, events)
+        self.frames = []
+
+    def refresh(self, screen, xy):
+        self.frames.append(screen)
+
+    def input_pending(self):
+        return bool(self.events)
+
+
+def test_typeahead_skips_frames():
+    con = TypeaheadConsole([(('self-insert', c), None) for c in 'abc'] +
+                           [('accept', None)])
+    reader = TestReader(con)
+    reader.typeahead_delay = 60
+    reader.readline()
+    # one frame for the initial prompt, one when the input was accepted
+    assert con.frames == [[''], ['abc']]
+
+    con = TypeaheadConsole([(('self-insert', c), None) for c in 'abc'] +
+                           [('accept', None)])
+    reader = TestReader(con)
+    reader.typeahead_delay = 0
+    reader.readline()
+    assert con.frames == [[''], ['a'], ['ab'], ['abc'], ['abc']]
+
+
+def test_paste():
+    read_spec([(('self-insert', 'a'),      ['a']),
+               (('paste', 'b\r\nc\rd\n'),  ['ab', 'c', 'd', '']),
+               ('accept',                  ['ab', 'c', 'd', ''])])
+
+
+class WindowConsole(TestConsole):
+    height = 5
+    width = 11
+
+    def get_window_height(self):
+        return self.height
+
+
+def test_lines_far_from_cursor_not_laid_out():
+    lines = ['line %d' % i for i in range(100)] + ['x' * 25]
+    reader = TestReader(WindowConsole([]))
+    reader.layout_margin = 2
+    reader.prepare()
+    reader.insert('\n'.join(lines))
+    screen = reader.calc_screen()
+    # the long last line wraps over three rows
+    assert reader.screen_rows == 103
+    assert reader.screen_top == 95
+    assert screen == lines[95:100] + ['x' * 10 + '\\'] * 2 + ['x' * 5]
+    assert reader.cxy == (5, 102)
+    reader.pos = 0
+    screen = reader.calc_screen()
+    assert (reader.screen_top, reader.screen_rows) == (0, 103)
+    assert screen == lines[:8]
+    assert reader.pos2xy(len(reader.buffer)) == (5, 102)
+    # lines come close to the cursor when the ones in between go
+    del reader.buffer[reader.buffer.newline_pos(2):
+                      reader.buffer.newline_pos(80)]
+    screen = reader.calc_screen()
+    assert screen == lines[:3] + lines[81:86]
+    # rows inserted above those returned move them down
+    reader.pos = len(reader.buffer)
+    reader.calc_screen()
+    reader.insert_screen_rows(screen, 0, ['menu'])
+    assert (reader.screen_top, reader.screen_rows) == (18, 26)
+    assert reader.cxy == (5, 25)
+
+
+def test_far_lines_counted_not_laid_out():
+    # five double-width characters and a composed one: two rows each
+    line = u'\u4e2d' * 5 + u'e\u0301'
+    wide = u''.join([u'\u4e2d' + WIDE_PAD] * 5) + u'\\'
+    reader = CountingReader(WindowConsole([]))
+    reader.ps1 = reader.ps2 = reader.ps3 = reader.ps4 = ''
+    reader.layout_margin = 0
+    reader.prepare()
+    reader.insert(u'\n'.join([line] * 50))
+    reader.pos = 0
+    reader.laid_out = 0
+    screen = reader.calc_screen()
+    # only the lines within a window's height of the cursor's
+    assert reader.laid_out == 6
+    assert (reader.screen_top, reader.screen_rows) == (0, 100)
+    assert screen == [wide, u'\xe9'] * 3
+    assert reader.pos2xy(len(reader.buffer)) == (1, 99)
+    assert reader.laid_out == 7
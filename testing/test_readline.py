@@ -39,3 +39,20 @@ def test_raw_input():
     result = readline_wrapper.raw_input('prompt:')
     assert result == b'input'
     assert isinstance(result, bytes_type)
+
+
+def test_add_history_before_append_history_file(tmp_path):
+    filename = str(tmp_path / 'history')
+    with open(filename, 'wb') as f:
+        f.write(b'one\ntwo\n')
+    master, slave = pty.openpty()
+    readline_wrapper = _ReadlineWrapper(slave, slave)
+    readline_wrapper.append_history = True
+    readline_wrapper.add_history('early')
+    readline_wrapper.read_history_file(filename)
+    readline_wrapper.add_history('late')
+    reader = readline_wrapper.get_reader()
+    assert reader.history == ['one', 'two', 'early', 'late']
+    # nothing is lost when the file is compacted and loaded again
+    reader.history_file.compact()
+    assert reader.history_file.load() == reader.history
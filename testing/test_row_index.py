@@ -0,0 +1,33 @@
+import random
+
+from pyrepl.row_index import RowIndex
+
+
+class SmallRowIndex(RowIndex):
+    LOAD = 3
+
+
+def test_matches_list():
+    rng = random.Random(42)
+    counts = [rng.randint(1, 4) for i in range(20)]
+    index = SmallRowIndex(counts)
+    for i in range(300):
+        lo = rng.randint(0, len(counts))
+        hi = min(len(counts), lo + rng.randint(0, 10))
+        new = [rng.randint(1, 4) for j in range(rng.randint(0, 8))]
+        counts[lo:hi] = new
+        index.replace(lo, hi, new)
+        assert len(index) == len(counts)
+        assert index.total() == sum(counts)
+        i = rng.randint(0, len(counts))
+        assert index.start(i) == sum(counts[:i])
+        if counts:
+            i = rng.randrange(len(counts))
+            assert index[i] == counts[i]
+            y = rng.randrange(index.total() + 2)
+            line, row = index.find(y)
+            if y < index.total():
+                assert sum(counts[:line]) + row == y
+                assert row < counts[line]
+            else:
+                assert line == len(counts) - 1
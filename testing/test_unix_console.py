@@ -0,0 +1,225 @@
+from __future__ import unicode_literals
+
+import os
+import termios
+
+import pytest
+
+from pyrepl.unicode_width import WIDE_PAD
+from .vterm import PtyTerminal, VTerm
+
+
+@pytest.fixture
+def term(monkeypatch):
+    monkeypatch.delenv('LINES', raising=False)
+    monkeypatch.delenv('COLUMNS', raising=False)
+    try:
+        t = PtyTerminal(6, 20)
+    except Exception as e:
+        pytest.skip('no pty or terminfo for xterm: %s' % (e,))
+    t.prepare()
+    yield t
+    t.restore()
+    t.close()
+
+
+def test_vterm():
+    vt = VTerm(3, 5)
+    vt.feed(b'abc\x1b[2D\x1b[@x\r\n12345')
+    assert vt.display() == ['axbc', '12345', '']
+    assert (vt.x, vt.y, vt.wrap_pending) == (4, 1, True)
+    vt.feed(b'6\x1b[1;2H\x1b[K')
+    assert vt.display() == ['a', '12345', '6']
+    assert vt.bytes == 28 and vt.moves == 4 and vt.erases == 2
+
+
+def test_draw_and_edit(term):
+    # the first frame starts on the row below the cursor's
+    vt = term.refresh(['>>> hello'], (9, 0))
+    assert vt.display()[1] == '>>> hello'
+    assert (vt.x, vt.y) == (9, 1)
+    vt = term.refresh(['>>> hello!'], (10, 0))
+    assert vt.display()[1] == '>>> hello!'
+    assert vt.chars == 1 and vt.moves == 0
+    vt = term.refresh(['>>> heXllo!'], (7, 0))
+    assert vt.display()[1] == '>>> heXllo!'
+    assert (vt.x, vt.y) == (7, 1)
+    assert vt.line_rewrites == 0
+    vt = term.refresh(['>>> he'], (6, 0))
+    assert vt.display()[1] == '>>> he'
+
+
+def test_lines_added_and_removed(term):
+    term.refresh(['a', 'b', 'c'], (1, 2))
+    vt = term.refresh(['a', 'B'], (1, 1))
+    assert vt.display()[1:5] == ['a', 'B', '', '']
+    assert (vt.x, vt.y) == (1, 2)
+
+
+def test_wide_characters(term):
+    wide = '中' + WIDE_PAD
+    vt = term.refresh(['ab' + wide + 'c'], (5, 0))
+    assert vt.display()[1] == 'ab中c'
+    assert (vt.x, vt.y) == (5, 1)
+    vt = term.refresh(['ab' + wide + wide + 'c'], (6, 0))
+    assert vt.display()[1] == 'ab中中c'
+    assert (vt.x, vt.y) == (6, 1)
+    vt = term.refresh(['abx' + wide + 'c'], (3, 0))
+    assert vt.display()[1] == 'abx中c'
+    assert (vt.x, vt.y) == (3, 1)
+
+
+def test_combining_marks(term):
+    vt = term.refresh(['ab\u0331c'], (3, 0))
+    assert vt.display()[1] == 'ab\u0331c'
+    assert (vt.x, vt.y) == (3, 1)
+    vt = term.refresh(['ab\u0331xc'], (4, 0))
+    assert vt.display()[1] == 'ab\u0331xc'
+    assert (vt.x, vt.y) == (4, 1)
+    vt = term.refresh(['a\u0331b\u0331xc'], (2, 0))
+    assert vt.display()[1] == 'a\u0331b\u0331xc'
+    assert (vt.x, vt.y) == (2, 1)
+    man = '\U0001f468\u200d' + WIDE_PAD
+    vt = term.refresh(['a' + man + 'b'], (4, 0))
+    assert vt.display()[1] == 'a\U0001f468\u200db'
+    assert (vt.x, vt.y) == (4, 1)
+
+
+def test_taller_than_the_terminal(term):
+    lines = ['line %d' % i for i in range(10)]
+    vt = term.refresh(lines, (6, 9))
+    assert vt.display() == lines[4:]
+    assert (vt.x, vt.y) == (6, 5)
+    vt = term.refresh(lines, (0, 0))
+    assert vt.display() == lines[:6]
+    assert (vt.x, vt.y) == (0, 0)
+
+
+def test_window_of_rows(term):
+    lines = ['line %d' % i for i in range(10)]
+    # only the rows near the cursor are passed
+    vt = term.refresh(lines[2:], (6, 9), 2, 10)
+    assert vt.display() == lines[4:]
+    lines[8] = 'line 8 edited'
+    vt = term.refresh(lines[3:], (6, 8), 3, 10)
+    assert vt.display() == lines[4:]
+    assert (vt.x, vt.y) == (6, 4)
+    vt = term.refresh(lines[:7], (0, 0), 0, 10)
+    assert vt.display() == lines[:6]
+
+
+def test_no_cr_or_hpa(term):
+    console = term.console
+    console._cr = console._hpa = None
+    lines = ['a' * 20, 'bcd']
+    term.refresh(lines, (20, 0))
+    # a wrap is pending, so only moves from the left margin are safe
+    vt = term.refresh(lines, (0, 1))
+    assert (vt.x, vt.y) == (0, 2)
+    vt = term.refresh(lines, (2, 1))
+    assert (vt.x, vt.y) == (2, 2)
+    # nor a way to move right but reprinting, which the double-width
+    # character rules out: only cup is left
+    console._cuf = console._cuf1 = None
+    lines = ['line %d' % i for i in range(8)] + ['\u4e2d' + WIDE_PAD + 'x' * 18]
+    term.refresh(lines, (20, 8))
+    vt = term.refresh(lines, (3, 8))
+    assert (vt.x, vt.y) == (3, 5)
+    assert vt.display() == [l.replace(WIDE_PAD, '') for l in lines[3:]]
+
+
+@pytest.mark.parametrize('scroll', [True, False])
+def test_scroll_then_edit(term, scroll):
+    if not scroll:
+        # redraw rather than scroll the terminal
+        term.console._ri = term.console._ind = None
+    lines = ['line %d' % i for i in range(7)]
+    term.refresh(lines, (0, 4))
+    vt = term.refresh(lines, (0, 6))
+    assert vt.display() == lines[1:]
+    lines[4] = 'line 4 edited'
+    vt = term.refresh(lines, (6, 4))
+    assert vt.display() == lines[1:]
+    assert (vt.x, vt.y) == (6, 3)
+    vt = term.refresh(lines, (0, 0))
+    assert vt.display() == lines[:6]
+    lines[2] = 'line 2 edited'
+    vt = term.refresh(lines, (0, 2))
+    assert vt.display() == lines[:6]
+    assert (vt.x, vt.y) == (0, 2)
+
+
+def test_cheapest_cursor_moves(term):
+    term.refresh(['>>> hello'], (9, 0))
+    vt = term.refresh(['>>> hello'], (4, 0))
+    assert (vt.x, vt.y) == (4, 1)
+    # reprinting 'he' is shorter than any cursor movement sequence
+    vt = term.refresh(['>>> hello'], (6, 0))
+    assert (vt.x, vt.y) == (6, 1) and vt.bytes == 2
+    assert vt.display()[1] == '>>> hello'
+    vt = term.refresh(['>>> hello'], (0, 0))
+    assert (vt.x, vt.y) == (0, 1) and vt.bytes == 1
+
+
+def test_cheapest_cursor_moves_when_tall(term):
+    lines = ['line %d' % i for i in range(10)]
+    term.refresh(lines, (6, 9))
+    vt = term.refresh(lines, (6, 8))
+    # one line up is cheaper than addressing the cursor absolutely
+    assert (vt.x, vt.y) == (6, 4) and vt.bytes == 3
+    vt = term.refresh(lines, (2, 4))
+    assert (vt.x, vt.y) == (2, 0)
+    assert vt.display() == lines[4:]
+
+
+def test_lines_inserted_and_deleted(term):
+    lines = ['>>> if x:', '...     first()', '...     second()', '...']
+    term.refresh(lines, (3, 3))
+    menu = ['[ foo ] [ bar ]', '[ baz ]']
+    # a completion menu appears below the first line and goes again;
+    # the terminal scrolls to make room
+    vt = term.refresh(lines[:1] + menu + lines[1:], (3, 5))
+    assert vt.display() == lines[:1] + menu + lines[1:]
+    assert vt.line_rewrites == 2
+    vt = term.refresh(lines, (3, 3))
+    assert vt.display() == lines + ['', '']
+    assert vt.line_rewrites == 0
+
+
+def test_lines_inserted_and_deleted_when_tall(term):
+    lines = ['line %d' % i for i in range(10)]
+    term.refresh(lines, (0, 9))
+    new = lines[:6] + ['new 1', 'new 2'] + lines[6:]
+    vt = term.refresh(new, (0, 7))
+    assert vt.display() == new[4:10]
+    assert vt.line_rewrites == 2
+    vt = term.refresh(lines, (0, 9))
+    assert vt.display() == lines[4:]
+
+
+@pytest.mark.parametrize('answer', [b'2', b'0', None])
+def test_synchronized_output(term, answer):
+    term.restore()
+    console = term.console
+    console.synchronized_output = True
+    console.probe_timeout = 0.01
+    if answer is not None:
+        # the terminal answers the query, with some typeahead around it
+        attrs = termios.tcgetattr(term.slave)
+        attrs[3] &= ~(termios.ECHO | termios.ICANON)
+        termios.tcsetattr(term.slave, termios.TCSANOW, attrs)
+        os.write(term.master, b'a\033[?2026;' + answer + b'$yb')
+    term.prepare()
+    events = []
+    while not console.event_queue.empty():
+        events.append(console.get_event().data)
+    assert events == (['a', 'b'] if answer else [])
+    term.vt.modes.clear()
+    vt = term.refresh(['>>> hello'], (9, 0))
+    vt = term.refresh(['>>> help'], (8, 0))
+    assert vt.line(vt.y) == '>>> help'
+    if answer == b'2':
+        # the frame is one synchronized update, without cursor hiding
+        assert vt.modes == {2026: False}
+    else:
+        assert 2026 not in vt.modes
@@ -45,3 +45,31 @@ def test_propagate_escape():
         Event('key', '\033', bytearray(b'\033')),
         Event('key', 'backspace', bytearray(b'\xf7'))
     ]
+
+
+def test_push_bytes():
+    keymap = {b'\033': {b'[': {b'A': 'up'}}}
+    q = EncodedQueue(keymap, 'utf-8')
+    q.push_bytes('a\u1234\033[Ab'.encode('utf-8'))
+    events = []
+    while not q.empty():
+        events.append(q.get())
+    assert [e.data for e in events] == ['a', '\u1234', 'up', 'b']
+    assert events[1].raw == '\u1234'.encode('utf-8')
+
+
+def test_bracketed_paste():
+    keymap = {b'\033': {b'[': {b'A': 'up',
+                               b'2': {b'0': {b'0': {b'~': 'paste start'}}}}}}
+    q = EncodedQueue(keymap, 'utf-8')
+    q.push_bytes(b'a\033[200~x = 1\nif x:\n  \033[A\xc3')
+    assert q.get() == Event('key', 'a', b'a')
+    assert q.empty()
+    # the end marker can be split across reads
+    q.push_bytes(b'\xa9\033[20')
+    assert q.empty()
+    q.push_bytes(b'1~\033[A')
+    pasted = 'x = 1\nif x:\n  \033[A\xe9'
+    assert q.get() == Event('paste', pasted, pasted.encode('utf-8'))
+    assert q.get() == Event('key', 'up', b'\033[A')
+    assert q.empty()
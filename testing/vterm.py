@@ -0,0 +1,335 @@
+"""A small VT100/xterm emulator, for checking what UnixConsole draws.
+
+VTerm interprets the subset of xterm's control sequences that
+UnixConsole emits for TERM=xterm into a grid of cells, and counts the
+bytes, cursor movements and line rewrites it took to get there.
+PtyTerminal runs a UnixConsole on a pseudo-terminal and feeds what it
+writes to a VTerm.
+"""
+
+import codecs
+import fcntl
+import os
+import pty
+import re
+import select
+import struct
+import termios
+
+from pyrepl.unicode_width import char_width
+
+# the placeholder in the cell after a double-width character
+WIDE_TAIL = ''
+
+_csi = re.compile(br'\x1b\[([?]?)([0-9;]*)([$]?[@A-Za-z~])')
+_esc = re.compile(br'\x1b([=>78DEM])')
+
+
+class VTerm(object):
+
+    def __init__(self, height=24, width=80):
+        self.height = height
+        self.width = width
+        self.cells = [[' '] * width for _ in range(height)]
+        self.x = self.y = 0
+        self.wrap_pending = False
+        self.modes = {}
+        self.scroll_top, self.scroll_bottom = 0, height - 1
+        self.pending = b''
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.bells = 0
+        self.replies = []   # bytes the terminal sends back
+        self.reset_counters()
+
+    def reset_counters(self):
+        """Start counting afresh, typically at the start of a frame."""
+        self.bytes = 0
+        self.moves = 0      # cursor movement sequences, CR, LF and BS
+        self.chars = 0      # characters printed
+        self.erases = 0     # erase and insert/delete sequences
+        self.printed = {}   # row -> number of characters printed on it
+
+    @property
+    def line_rewrites(self):
+        """The number of rows that have been printed over entirely
+        since the counters were reset."""
+        n = 0
+        for y, count in self.printed.items():
+            if 0 <= y < self.height and count >= len(self.line(y)) > 0:
+                n += 1
+        return n
+
+    def line(self, y):
+        return ''.join(self.cells[y]).rstrip(' ')
+
+    def display(self):
+        """Return the rows of the screen, without trailing blanks."""
+        return [self.line(y) for y in range(self.height)]
+
+    def feed(self, data):
+        self.bytes += len(data)
+        data = self.pending + data
+        self.pending = b''
+        i = 0
+        n = len(data)
+        while i < n:
+            c = data[i:i + 1]
+            if c == b'\x1b':
+                m = _csi.match(data, i) or _esc.match(data, i)
+                if m is None:
+                    if n - i < 32:
+                        # the rest of the sequence is yet to come
+                        self.pending = data[i:]
+                        return
+                    raise ValueError("unknown sequence %r" % data[i:i + 8])
+                if m.re is _csi:
+                    self._csi(m.group(1), m.group(2), m.group(3))
+                else:
+                    self._esc(m.group(1))
+                i = m.end()
+                continue
+            j = i
+            while j < n and data[j:j + 1] >= b' ' and data[j:j + 1] != b'\x7f':
+                j += 1
+            if j > i:
+                for ch in self.decoder.decode(data[i:j]):
+                    self._print(ch)
+                i = j
+                continue
+            self._control(c)
+            i += 1
+
+    # -- printing
+
+    def _print(self, ch):
+        w = char_width(ch)
+        if w == 0:
+            if self.x > 0:
+                # with a wrap pending, the cursor is still on the last
+                # character printed
+                x = self.x if self.wrap_pending else self.x - 1
+                if self.cells[self.y][x] == WIDE_TAIL and x > 0:
+                    x -= 1
+                self.cells[self.y][x] += ch
+            return
+        if self.wrap_pending or self.x + w > self.width:
+            self.x = 0
+            self._linefeed()
+        self.wrap_pending = False
+        row = self.cells[self.y]
+        self._clear_wide(self.y, self.x)
+        if w == 2:
+            self._clear_wide(self.y, self.x + 1)
+        row[self.x] = ch
+        if w == 2:
+            row[self.x + 1] = WIDE_TAIL
+        self.chars += 1
+        self.printed[self.y] = self.printed.get(self.y, 0) + w
+        self.x += w
+        if self.x >= self.width:
+            self.x = self.width - 1
+            self.wrap_pending = True
+
+    def _clear_wide(self, y, x):
+        # overwriting half of a double-width character blanks the other
+        row = self.cells[y]
+        if x < self.width and row[x] == WIDE_TAIL and x > 0:
+            row[x - 1] = ' '
+        if x + 1 < self.width and row[x + 1] == WIDE_TAIL:
+            row[x + 1] = ' '
+
+    # -- control characters and sequences
+
+    def _control(self, c):
+        if c == b'\r':
+            self.moves += 1
+            self.x = 0
+        elif c == b'\n':
+            self.moves += 1
+            self._linefeed()
+        elif c == b'\b':
+            self.moves += 1
+            if self.x > 0 and not self.wrap_pending:
+                self.x -= 1
+        elif c == b'\a':
+            self.bells += 1
+        elif c == b'\t':
+            self.moves += 1
+            self.x = min(self.width - 1, (self.x // 8 + 1) * 8)
+        else:
+            return
+        self.wrap_pending = False
+
+    def _linefeed(self):
+        if self.y == self.scroll_bottom:
+            self._scroll_up(self.scroll_top, 1)
+        elif self.y < self.height - 1:
+            self.y += 1
+
+    def _scroll_up(self, top, n):
+        for _ in range(n):
+            del self.cells[top]
+            self.cells.insert(self.scroll_bottom, [' '] * self.width)
+
+    def _scroll_down(self, top, n):
+        for _ in range(n):
+            del self.cells[self.scroll_bottom]
+            self.cells.insert(top, [' '] * self.width)
+
+    def _esc(self, final):
+        if final == b'M':
+            self.moves += 1
+            if self.y == self.scroll_top:
+                self._scroll_down(self.scroll_top, 1)
+            elif self.y > 0:
+                self.y -= 1
+        elif final == b'D':
+            self.moves += 1
+            self._linefeed()
+        elif final == b'E':
+            self.moves += 1
+            self.x = 0
+            self._linefeed()
+        elif final == b'7':
+            self.saved = self.x, self.y
+        elif final == b'8':
+            self.x, self.y = getattr(self, 'saved', (0, 0))
+        self.wrap_pending = False
+
+    def _csi(self, private, params, final):
+        args = [int(p) if p else 0 for p in params.split(b';')]
+        arg = args[0] or 1
+        if private:
+            if final in (b'h', b'l'):
+                for mode in args:
+                    self.modes[mode] = final == b'h'
+            elif final == b'$p':
+                # DECRQM: report unknown modes as not recognized
+                mode = args[0]
+                state = {True: 1, False: 2}.get(self.modes.get(mode), 0)
+                self.replies.append(
+                    ('\x1b[?%d;%d$y' % (mode, state)).encode('ascii'))
+            return
+        if final == b'm':
+            return
+        self.wrap_pending = False
+        if final in (b'A', b'B', b'C', b'D', b'G', b'H', b'd'):
+            self.moves += 1
+        if final == b'A':
+            self.y = max(self.y - arg, 0)
+        elif final == b'B':
+            self.y = min(self.y + arg, self.height - 1)
+        elif final == b'C':
+            self.x = min(self.x + arg, self.width - 1)
+        elif final == b'D':
+            self.x = max(self.x - arg, 0)
+        elif final == b'G':
+            self.x = min(arg - 1, self.width - 1)
+        elif final == b'd':
+            self.y = min(arg - 1, self.height - 1)
+        elif final == b'H':
+            row = args[0] or 1
+            col = args[1] if len(args) > 1 and args[1] else 1
+            self.y = min(row - 1, self.height - 1)
+            self.x = min(col - 1, self.width - 1)
+        elif final == b'K':
+            self.erases += 1
+            row = self.cells[self.y]
+            mode = args[0]
+            if mode == 0:
+                self._clear_wide(self.y, self.x)
+                row[self.x:] = [' '] * (self.width - self.x)
+            elif mode == 1:
+                row[:self.x + 1] = [' '] * (self.x + 1)
+            else:
+                row[:] = [' '] * self.width
+        elif final == b'J':
+            self.erases += 1
+            mode = args[0]
+            if mode == 0:
+                self.cells[self.y][self.x:] = [' '] * (self.width - self.x)
+                rows = range(self.y + 1, self.height)
+            elif mode == 1:
+                rows = range(0, self.y)
+            else:
+                rows = range(self.height)
+            for y in rows:
+                self.cells[y] = [' '] * self.width
+        elif final == b'@':
+            self.erases += 1
+            row = self.cells[self.y]
+            row[self.x:self.x] = [' '] * arg
+            del row[self.width:]
+        elif final == b'P':
+            self.erases += 1
+            row = self.cells[self.y]
+            del row[self.x:self.x + arg]
+            row.extend([' '] * (self.width - len(row)))
+        elif final == b'L':
+            self.erases += 1
+            if self.scroll_top <= self.y <= self.scroll_bottom:
+                self._scroll_down(self.y, arg)
+            self.x = 0
+        elif final == b'M':
+            self.erases += 1
+            if self.scroll_top <= self.y <= self.scroll_bottom:
+                self._scroll_up(self.y, arg)
+            self.x = 0
+        elif final == b'S':
+            self._scroll_up(self.scroll_top, arg)
+        elif final == b'T':
+            self._scroll_down(self.scroll_top, arg)
+        elif final == b'r':
+            top = args[0] or 1
+            bottom = args[1] if len(args) > 1 and args[1] else self.height
+            self.scroll_top, self.scroll_bottom = top - 1, bottom - 1
+            self.x = self.y = 0
+        else:
+            raise ValueError("unknown sequence CSI %r %r" % (params, final))
+
+
+class PtyTerminal(object):
+    """A UnixConsole writing to a VTerm through a pseudo-terminal.
+
+    Output is collected by pump(), which the methods here call after
+    every operation, so a single frame must fit in the pty's buffer."""
+
+    def __init__(self, height=24, width=80, console_class=None, **kw):
+        if console_class is None:
+            from pyrepl.unix_console import UnixConsole as console_class
+        self.master, self.slave = pty.openpty()
+        fcntl.ioctl(self.slave, termios.TIOCSWINSZ,
+                    struct.pack('hhhh', height, width, 0, 0))
+        self.vt = VTerm(height, width)
+        self.console = console_class(self.slave, self.slave, term=b'xterm',
+                                     encoding='utf-8', **kw)
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def pump(self):
+        while select.select([self.master], [], [], 0)[0]:
+            data = os.read(self.master, 65536)
+            if not data:
+                break
+            self.vt.feed(data)
+        for reply in self.vt.replies:
+            os.write(self.master, reply)
+        del self.vt.replies[:]
+
+    def prepare(self):
+        self.console.prepare()
+        self.pump()
+
+    def restore(self):
+        self.console.restore()
+        self.pump()
+
+    def refresh(self, screen, cxy, top=0, total=None):
+        """Draw a frame; the counters of the VTerm cover just it."""
+        self.vt.reset_counters()
+        # refresh() can append to the screen it is given
+        self.console.refresh(list(screen), cxy, top, total)
+        self.pump()
+        return self.vt